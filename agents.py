@@ -4,6 +4,9 @@ from download_all_papers import download_all_papers
 from extract_all_data_to_json import main as run_extract_data
 from summary_agent import generate_summaries
 from review_writer_agent import main as run_review_writer
+from pipeline import run_pipeline
+from task_worker import run_stage_on_queue
+from tools import telemetry
 
 class ReferenceScraperAgent:
     """
@@ -17,6 +20,7 @@ class ReferenceScraperAgent:
         RESEARCH_PAPERS_DIR = os.path.join(output_dir, "research_papers")
         os.makedirs(RESEARCH_PAPERS_DIR, exist_ok=True)
 
+    @telemetry.traced("stage", stage="reference_scraper")
     def run(self, research_topic):
         self.log_fn(f"ReferenceScraperAgent: Starting scraping for topic '{research_topic}'.")
         run_deep_reference_scraper(research_topic, output_dir=os.path.dirname(self.output_file), log_fn=self.log_fn)
@@ -29,69 +33,125 @@ class ReferenceScraperAgent:
 class DownloaderAgent:
     """
     Agent that downloads PDFs based on the reference JSON file.
+    If a task_queue is given, the downloads are queued as per-paper tasks for task workers.
     """
-    def __init__(self, output_dir, log_fn=print):
+    def __init__(self, output_dir, log_fn=print, task_queue=None):
         self.log_fn = log_fn
+        self.task_queue = task_queue
+        self.output_dir = output_dir
         self.input_file = os.path.join(output_dir, "deep_reference_results.json")
         RESEARCH_PAPERS_DIR = os.path.join(output_dir, "research_papers")
         os.makedirs(RESEARCH_PAPERS_DIR, exist_ok=True)
         self.output_folder = RESEARCH_PAPERS_DIR
         self.log_fn("DownloaderAgent initialized.")
 
-    def run(self):
+    @telemetry.traced("stage", stage="downloader")
+    def run(self, titles=None):
         self.log_fn("DownloaderAgent: Starting PDF download process.")
-        download_all_papers(output_folder=self.output_folder, log_fn=self.log_fn)
+        if self.task_queue is not None:
+            run_stage_on_queue(self.task_queue, self.output_dir, "download", items=titles, log_fn=self.log_fn)
+        else:
+            download_all_papers(output_folder=self.output_folder, log_fn=self.log_fn, titles=titles)
         self.log_fn("DownloaderAgent: Download process complete.")
 
 
 class PDFExtractionAgent:
     """
     Agent that extracts research content from downloaded PDFs and compiles it into a JSON file.
+    If a task_queue is given, each PDF is queued as a task for task workers.
     """
-    def __init__(self, output_dir, log_fn=print):
+    def __init__(self, output_dir, log_fn=print, task_queue=None):
         self.log_fn = log_fn
+        self.task_queue = task_queue
+        self.output_dir = output_dir
         RESEARCH_PAPERS_DIR = os.path.join(output_dir, "research_papers")
         os.makedirs(RESEARCH_PAPERS_DIR, exist_ok=True)
         self.input_folder = RESEARCH_PAPERS_DIR
         self.output_file = os.path.join(output_dir, "all_research_content.json")
         self.log_fn("PDFExtractionAgent initialized.")
 
-    def run(self):
+    @telemetry.traced("stage", stage="pdf_extraction")
+    def run(self, filenames=None):
         self.log_fn("PDFExtractionAgent: Extracting content from PDFs.")
-        run_extract_data(self.input_folder, self.output_file, log_fn=self.log_fn)
+        if self.task_queue is not None:
+            run_stage_on_queue(self.task_queue, self.output_dir, "extract", items=filenames, log_fn=self.log_fn)
+        else:
+            run_extract_data(self.input_folder, self.output_file, log_fn=self.log_fn, filenames=filenames)
         self.log_fn(f"PDFExtractionAgent: Extraction complete. Output saved to {self.output_file}.")
 
 
 class SummarizerAgent:
     """
     Agent that generates summaries for the extracted research content.
+    With batch=True the summaries are produced offline through the OpenAI Batch API,
+    otherwise stream_fn (if given) receives each summary as it is streamed.
+    If a task_queue is given, each paper is queued as a task for task workers instead.
     """
-    def __init__(self, output_dir, log_fn=print):
+    def __init__(self, output_dir, log_fn=print, batch=False, stream_fn=None, task_queue=None):
         self.log_fn = log_fn
+        self.task_queue = task_queue
+        self.output_dir = output_dir
+        self.batch = batch
+        self.stream_fn = stream_fn
         self.input_file = os.path.join(output_dir, "all_research_content.json")
         self.output_file = os.path.join(output_dir, "summaries.json")
         self.log_fn("SummarizerAgent initialized.")
 
-    def run(self):
+    @telemetry.traced("stage", stage="summarizer")
+    def run(self, paper_keys=None):
         self.log_fn("SummarizerAgent: Generating summaries for each paper.")
-        generate_summaries(json_file=self.input_file, output_file=self.output_file, log_fn=self.log_fn)
+        if self.task_queue is not None:
+            run_stage_on_queue(self.task_queue, self.output_dir, "summarize", items=paper_keys, log_fn=self.log_fn)
+            self.log_fn(f"SummarizerAgent: Summaries complete. Output saved to {self.output_file}.")
+            return
+        generate_summaries(
+            json_file=self.input_file,
+            output_file=self.output_file,
+            log_fn=self.log_fn,
+            batch=self.batch and paper_keys is None,
+            stream_fn=self.stream_fn,
+            paper_keys=paper_keys,
+        )
         self.log_fn(f"SummarizerAgent: Summaries complete. Output saved to {self.output_file}.")
 
 
+class PipelinedResearchAgent:
+    """
+    Agent that runs scraping, downloading, extraction and summarization as one pipeline,
+    handing each paper to the next stage as soon as it is ready instead of waiting for
+    the previous stage to finish.
+    """
+    def __init__(self, output_dir, log_fn=print, stream_fn=None):
+        self.log_fn = log_fn
+        self.stream_fn = stream_fn
+        self.output_dir = output_dir
+        self.output_file = os.path.join(output_dir, "summaries.json")
+        self.log_fn("PipelinedResearchAgent initialized.")
+
+    @telemetry.traced("stage", stage="pipelined_research")
+    def run(self, research_topic):
+        self.log_fn(f"PipelinedResearchAgent: Starting pipelined research for topic '{research_topic}'.")
+        run_pipeline(research_topic, self.output_dir, log_fn=self.log_fn, stream_fn=self.stream_fn)
+        self.log_fn(f"PipelinedResearchAgent: Pipeline complete. Summaries saved to {self.output_file}.")
+
+
 class ReviewWriterAgent:
     """
     Agent that generates a final review paper based on the generated summaries.
+    If stream_fn is given, it receives the review text as it is streamed.
     """
-    def __init__(self, output_dir, log_fn=print):
+    def __init__(self, output_dir, log_fn=print, stream_fn=None):
         self.log_fn = log_fn
+        self.stream_fn = stream_fn
         self.output_dir = output_dir         # <--- ADD THIS LINE
         self.input_file = os.path.join(output_dir, "summaries.json")
         self.output_file = os.path.join(output_dir, "review_paper.pdf")
         self.log_fn("ReviewWriterAgent initialized.")
 
+    @telemetry.traced("stage", stage="review_writer")
     def run(self):
         self.log_fn("ReviewWriterAgent: Generating the final review paper.")
-        run_review_writer(self.output_dir, log_fn=self.log_fn)
+        run_review_writer(self.output_dir, log_fn=self.log_fn, stream_fn=self.stream_fn)
         self.log_fn(f"ReviewWriterAgent: Review paper generated and saved as {self.output_file}.")
 
 
@@ -1,8 +1,7 @@
 import os
-import re
-import tempfile
 import streamlit as st
-from manager_agent import ManagerAgent
+from streamlit_autorefresh import st_autorefresh
+from job_runner import JobRunner
 
 st.title("Deep Research Bot")
 st.markdown(
@@ -12,35 +11,64 @@ st.markdown(
 
 # Determine the root directory (where app.py is located)
 app_root = os.path.dirname(os.path.abspath(__file__))
+jobs_dir = os.path.join(app_root, "jobs")
 
-# Create a temporary directory for this session if not already created.
-if "output_dir" not in st.session_state:
-    temp_dir_obj = tempfile.TemporaryDirectory(prefix="user_", dir=app_root)
-    st.session_state.temp_dir_obj = temp_dir_obj  # Save the object so it isn’t garbage-collected
-    st.session_state.output_dir = temp_dir_obj.name
 
-st.write("Temporary directory for this session: " + st.session_state.output_dir)
+@st.cache_resource
+def get_job_runner():
+    # One bounded pool of worker processes per server, shared by all sessions.
+    runner = JobRunner(os.path.join(jobs_dir, "jobs.sqlite3"))
+    runner.start()
+    return runner
+
+
+runner = get_job_runner()
+store = runner.store
+
+# The job's token is kept in the URL, so a reloaded or reconnected browser picks the run up again.
+# Job ids are sequential, so they are never put in the URL: anyone could guess other users' runs.
+if "job_token" not in st.session_state and "job" in st.query_params:
+    st.session_state.job_token = st.query_params["job"]
 
 # Input for research topic
 research_topic = st.text_input("Enter your research topic:")
 
 if st.button("Start Research") and research_topic:
-    st.session_state.research_topic = research_topic
-    # Run the pipeline synchronously with a spinner
-    with st.spinner("Running research pipeline, please wait..."):
-        # Use st.write as the log function to immediately display log messages
-        manager = ManagerAgent(st.session_state.research_topic, log_fn=st.write, output_dir=st.session_state.output_dir)
-        manager.run()
-        st.session_state.review_result = getattr(manager, "review_result", "")
-    
-    # Display the final review PDF download if generated
-    if st.session_state.review_result:
-        match = re.search(r'Output saved as:\s*(.*)', st.session_state.review_result)
-        if match:
-            review_pdf_path = match.group(1).strip()
-        else:
-            review_pdf_path = None
+    try:
+        job_id = store.submit(research_topic, jobs_dir)
+        st.session_state.job_token = store.get(job_id)["token"]
+        st.query_params["job"] = st.session_state.job_token
+    except RuntimeError as e:
+        st.error(str(e))
+
+job = store.get_by_token(st.session_state.job_token) if "job_token" in st.session_state else None
+if "job_token" in st.session_state and job is None:
+    st.warning("This link does not belong to a research run. Start a new one above.")
+    del st.session_state.job_token
 
+if job:
+    st.write(f"Research topic: {job['research_topic']}")
+    st.write("Output directory for this run: " + job["output_dir"])
+
+    if job["status"] in ("queued", "running"):
+        # Rerun the script every few seconds to poll the job's progress.
+        st_autorefresh(interval=3000, key=f"job_{job['id']}")
+
+    if job["status"] == "queued":
+        st.info(f"Waiting for a free worker ({store.queue_position(job['id'])} runs ahead of yours).")
+    elif job["status"] == "running":
+        st.info("Running research pipeline, please wait...")
+
+    with st.expander("Log", expanded=job["status"] == "running"):
+        for _, message in store.logs(job["id"]):
+            st.write(message)
+
+    if job["status"] == "running" and job["partial_output"]:
+        st.markdown(job["partial_output"])
+
+    # Display the final review PDF download if generated
+    if job["status"] == "done":
+        review_pdf_path = job["result_pdf"]
         if review_pdf_path and os.path.exists(review_pdf_path):
             with open(review_pdf_path, "rb") as f:
                 pdf_bytes = f.read()
@@ -53,5 +81,5 @@ if st.button("Start Research") and research_topic:
             st.success("The review paper has been generated!")
         else:
             st.error("Review PDF not found!")
-    else:
-        st.error("No review result generated.")
+    elif job["status"] == "failed":
+        st.error(f"No review result generated: {job['error']}")
@@ -0,0 +1,127 @@
+import random
+import textwrap
+
+# Vocabulary of the synthetic papers. The word "references" must not appear in the
+# body text, because extract_references splits the text at its first occurrence.
+_TOPICS = [
+    "graph neural networks", "federated learning", "retrieval augmented generation",
+    "protein structure prediction", "reinforcement learning", "causal inference",
+    "speech recognition", "anomaly detection", "knowledge distillation", "few-shot learning",
+]
+_METHODS = [
+    "contrastive pretraining", "sparse attention", "variational inference", "message passing",
+    "curriculum learning", "low-rank adaptation", "Bayesian optimization", "data augmentation",
+]
+_SENTENCES = [
+    "We study {topic} and propose a method based on {method}.",
+    "Our experiments on standard benchmarks show consistent gains over strong baselines.",
+    "The approach scales linearly with the number of training examples.",
+    "We analyze the trade-off between accuracy and computational cost in detail.",
+    "Ablation studies confirm that {method} is the main source of the improvement.",
+    "Prior work on {topic} relied on hand-crafted features and small datasets.",
+    "We release code and pretrained models to support reproducible research.",
+    "Limitations include sensitivity to hyperparameters and distribution shift.",
+]
+
+
+def build_corpus(num_papers=120, refs_per_paper=4, seed=0):
+    """
+    Builds a deterministic synthetic corpus. Paper i cites papers with higher ids, so a
+    breadth-first crawl from the first papers reaches the rest of the corpus.
+    Returns a list of dictionaries with id, title, year, doi, body and cited ids.
+    """
+    rng = random.Random(seed)
+    papers = []
+    for paper_id in range(num_papers):
+        topic = rng.choice(_TOPICS)
+        method = rng.choice(_METHODS)
+        # The title must not end in the number: extract_references splits entries at "<digits>. ",
+        # which would cut the id off a reference like "...: study 8. Journal of Benchmarks".
+        title = f"Study {paper_id}: {method} for {topic}"
+        paragraphs = []
+        for _ in range(4):
+            sentences = [rng.choice(_SENTENCES).format(topic=topic, method=method) for _ in range(6)]
+            paragraphs.append(" ".join(sentences))
+        later = list(range(paper_id + 1, num_papers))
+        cites = sorted(rng.sample(later, min(refs_per_paper, len(later))))
+        papers.append({
+            "id": paper_id,
+            "title": title,
+            "year": 2015 + paper_id % 10,
+            "doi": f"10.5555/bench.{paper_id}",
+            "body": paragraphs,
+            "cites": cites,
+        })
+    return papers
+
+
+def crawl_size(corpus, max_papers, max_level, seeds=3):
+    """Number of papers a breadth-first crawl like deep_reference_scraper's collects from the seeds."""
+    collected = set(range(min(seeds, len(corpus))))
+    level_papers = sorted(collected)
+    for _ in range(max_level):
+        next_level = []
+        for paper_id in level_papers:
+            for cited_id in corpus[paper_id]["cites"]:
+                if len(collected) >= max_papers:
+                    return len(collected)
+                if cited_id not in collected:
+                    collected.add(cited_id)
+                    next_level.append(cited_id)
+        level_papers = next_level
+    return len(collected)
+
+
+def paper_lines(paper, corpus):
+    """Text lines of a paper as printed in its PDF, ending with a numbered bibliography."""
+    lines = [paper["title"], ""]
+    for paragraph in paper["body"]:
+        lines.extend(textwrap.wrap(paragraph, 90))
+        lines.append("")
+    lines.append("References")
+    for number, cited_id in enumerate(paper["cites"], start=1):
+        cited = corpus[cited_id]
+        # Entries are not wrapped, so each one reaches the Scholar search as a single line.
+        lines.append(f"[{number}] {cited['title']}. Journal of Benchmarks, {cited['year']}.")
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(lines, lines_per_page=50):
+    """Renders text lines into a minimal PDF (Helvetica, one text object per page)."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [None, None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        commands = ["BT", "/F1 10 Tf", "14 TL", "50 780 Td"]
+        for line in page:
+            commands.append(f"({_escape(line)}) '")
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1", "replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        output += f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+    xref_at = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
@@ -0,0 +1,282 @@
+import json
+import time
+import uuid
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.corpus import build_corpus, paper_lines, make_pdf
+
+# Local stand-ins for the external services of the pipeline, all served by one HTTP server:
+#   POST /scholar                 Serper Google Scholar search
+#   GET  /pdf/<id>.pdf            publisher PDF host
+#   GET  /html/<id>               publisher article page linking to the PDF (read with Selenium)
+#   GET  /scihub/<doi>            Sci-Hub page with the PDF in an iframe
+#   POST /v1/chat/completions     OpenAI chat completions (plain and streamed)
+#   POST /v1/files, GET /v1/files/<id>/content, POST /v1/batches, GET /v1/batches/<id>
+#                                 OpenAI files and Batch API
+
+
+class ServiceConfig:
+    """Latency and throttling of the fake services (all times in seconds)."""
+    def __init__(self, serper_latency=0.05, serper_rate_limit=10.0, openai_latency=0.2,
+                 openai_tokens_per_second=200.0, pdf_latency=0.05, scihub_fraction=0.2, html_fraction=0.1):
+        self.serper_latency = serper_latency
+        self.serper_rate_limit = serper_rate_limit      # Requests per second before answering 429.
+        self.openai_latency = openai_latency            # Time to first token.
+        self.openai_tokens_per_second = openai_tokens_per_second
+        self.pdf_latency = pdf_latency
+        self.scihub_fraction = scihub_fraction          # Share of papers only reachable through Sci-Hub.
+        self.html_fraction = html_fraction              # Share of papers only linked from an article page.
+
+
+class _RateLimiter:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakeServices:
+    """Starts the fake services on a local port; base_url is where they are reachable."""
+    def __init__(self, config=None, num_papers=120, host="127.0.0.1", port=0):
+        self.config = config or ServiceConfig()
+        self.corpus = build_corpus(num_papers)
+        self.pdfs = {}
+        self.files = {}
+        self.batches = {}
+        self.stats = {"serper_requests": 0, "serper_throttled": 0, "openai_requests": 0, "pdf_requests": 0, "html_requests": 0}
+        self.lock = threading.Lock()
+        self.serper_limiter = _RateLimiter(self.config.serper_rate_limit)
+        handler = type("Handler", (_Handler,), {"services": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def pdf_bytes(self, paper_id):
+        with self.lock:
+            if paper_id not in self.pdfs:
+                self.pdfs[paper_id] = make_pdf(paper_lines(self.corpus[paper_id], self.corpus))
+            return self.pdfs[paper_id]
+
+    def scholar_result(self, paper):
+        result = {
+            "title": paper["title"],
+            "year": paper["year"],
+            "citedBy": 100 - paper["id"] % 100,
+            "link": f"https://doi.org/{paper['doi']}",
+        }
+        # Some papers have no direct PDF link, so the Sci-Hub path and the article page
+        # path (get_pdf_from_html) are exercised too: every n-th and every m-th paper.
+        every_scihub = round(1 / self.config.scihub_fraction) if self.config.scihub_fraction else 0
+        every_html = round(1 / self.config.html_fraction) if self.config.html_fraction else 0
+        if every_scihub and paper["id"] % every_scihub == 0:
+            pass
+        elif every_html and paper["id"] % every_html == every_html - 1:
+            result["htmlUrl"] = f"{self.base_url}/html/{paper['id']}"
+        else:
+            result["pdfUrl"] = f"{self.base_url}/pdf/{paper['id']}.pdf"
+        return result
+
+    def search(self, query):
+        # Longest title first, so "study 12" is not answered with "study 1".
+        matches = sorted((paper for paper in self.corpus if paper["title"] in query), key=lambda p: -len(p["title"]))
+        if not matches:
+            # A topic query: the first papers of the corpus are the seeds.
+            matches = self.corpus[:3]
+        return [self.scholar_result(paper) for paper in matches[:3]]
+
+    def completion_text(self, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        words = prompt.split()
+        return "This paper " + " ".join(words[:120]) + "."
+
+    def run_batch(self, input_file_id):
+        output_lines = []
+        for line in self.files[input_file_id]["content"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            text = self.completion_text(request["body"]["messages"])
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": _completion_body(request["body"].get("model", ""), text)},
+                "error": None,
+            }))
+        return self.add_file("\n".join(output_lines).encode("utf-8"), "batch_output.jsonl", "batch_output")
+
+    def add_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed", "content": content,
+            }
+        return file_id
+
+
+def _completion_body(model, text):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": len(text.split()), "total_tokens": 100 + len(text.split())},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    services = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        services = self.services
+        config = services.config
+        body = self._body()
+        if self.path == "/scholar":
+            services.count("serper_requests")
+            if not services.serper_limiter.allow():
+                services.count("serper_throttled")
+                self._send(429, {"message": "Too many requests"}, headers={"Retry-After": "1"})
+                return
+            time.sleep(config.serper_latency)
+            query = json.loads(body or b"{}").get("q", "")
+            self._send(200, {"organic": services.search(query)})
+        elif self.path == "/v1/chat/completions":
+            services.count("openai_requests")
+            request = json.loads(body)
+            text = services.completion_text(request.get("messages", []))
+            time.sleep(config.openai_latency)
+            if request.get("stream"):
+                self._stream_completion(request.get("model", ""), text)
+            else:
+                time.sleep(len(text.split()) / config.openai_tokens_per_second)
+                self._send(200, _completion_body(request.get("model", ""), text))
+        elif self.path == "/v1/files":
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin-1") + body
+            )
+            upload = next(part for part in message.iter_parts() if part.get_filename())
+            file_id = services.add_file(upload.get_payload(decode=True), upload.get_filename(), "batch")
+            self._send(200, {k: v for k, v in services.files[file_id].items() if k != "content"})
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+            output_file_id = services.run_batch(request["input_file_id"])
+            batch = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                "status": "completed", "output_file_id": output_file_id, "created_at": int(time.time()),
+            }
+            services.batches[batch_id] = batch
+            self._send(200, batch)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _stream_completion(self, model, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        delay = 1 / self.services.config.openai_tokens_per_second
+        words = text.split()
+        chunks = [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]
+        chunks += [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None} for word in words]
+        chunks.append({"index": 0, "delta": {}, "finish_reason": "stop"})
+        for choice in chunks:
+            self._write_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                               "model": model, "choices": [choice]})
+            time.sleep(delay)
+        self._write_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                           "model": model, "choices": [],
+                           "usage": {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)}})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, data):
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        services = self.services
+        if self.path.startswith("/pdf/") and self.path.endswith(".pdf"):
+            services.count("pdf_requests")
+            time.sleep(services.config.pdf_latency)
+            try:
+                paper_id = int(self.path[len("/pdf/"):-len(".pdf")])
+                self._send(200, services.pdf_bytes(paper_id), content_type="application/pdf")
+            except (ValueError, IndexError):
+                self._send(404, b"not found", content_type="text/plain")
+        elif self.path.startswith("/html/"):
+            services.count("html_requests")
+            time.sleep(services.config.pdf_latency)
+            paper_id = self.path[len("/html/"):]
+            page = (f'<html><body><h1>Paper {paper_id}</h1>'
+                    f'<a href="{services.base_url}/pdf/{paper_id}.pdf">Download PDF</a></body></html>')
+            self._send(200, page.encode("utf-8"), content_type="text/html")
+        elif self.path.startswith("/scihub/"):
+            time.sleep(services.config.pdf_latency)
+            doi = self.path[len("/scihub/"):]
+            paper_id = doi.rsplit(".", 1)[-1]
+            page = f'<html><body><iframe src="{services.base_url}/pdf/{paper_id}.pdf"></iframe></body></html>'
+            self._send(200, page.encode("utf-8"), content_type="text/html")
+        elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            file_id = self.path[len("/v1/files/"):-len("/content")]
+            if file_id in services.files:
+                self._send(200, services.files[file_id]["content"], content_type="application/octet-stream")
+            else:
+                self._send(404, {"error": "not found"})
+        elif self.path.startswith("/v1/batches/"):
+            batch = services.batches.get(self.path[len("/v1/batches/"):])
+            self._send(200 if batch else 404, batch or {"error": "not found"})
+        else:
+            self._send(404, {"error": "not found"})
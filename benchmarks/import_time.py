@@ -0,0 +1,141 @@
+"""
+Import-time benchmark of the entry points.
+
+Imports each entry point in a fresh interpreter, without API keys in the environment,
+and reports the median wall time over several runs together with the packages that
+contributed most to it (from python -X importtime). An entry point that fails to import
+is reported with its error.
+
+    python -m benchmarks.import_time --report imports.json
+    python -m benchmarks.import_time --baseline imports.json --tolerance 0.25
+
+With --baseline, the run fails (exit status 1) if an entry point imports slower than in
+the baseline by more than the tolerance, or no longer imports at all.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# app is not measured: importing it runs the Streamlit script, which starts job workers.
+ENTRY_POINTS = [
+    "job_runner",
+    "task_worker",
+    "manager_agent",
+    "langchain_tools",
+    "agents",
+    "pipeline",
+    "deep_reference_scraper",
+    "download_all_papers",
+    "extract_all_data_to_json",
+    "summary_agent",
+    "review_writer_agent",
+]
+# Entry points must import without these; the keys are only needed once a service is called.
+API_KEY_VARIABLES = ["OPENAI_API_KEY", "SERPER_API_KEY"]
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEASURE = (
+    "import time, importlib; started = time.perf_counter(); importlib.import_module({module!r}); "
+    "print(time.perf_counter() - started)"
+)
+
+
+def _parse_importtime(stderr, limit):
+    """Top-level packages with the most import time of their own modules, in seconds."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            own, _, name = line[len("import time:"):].split("|")
+            own = int(own) / 1e6
+        except ValueError:
+            continue  # The header line.
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + own
+    ranked = sorted(packages.items(), key=lambda item: -item[1])[:limit]
+    return [{"package": package, "seconds": round(seconds, 4)} for package, seconds in ranked]
+
+
+def measure(module, repeat=5, top=10, timeout=60):
+    """Imports module in repeat fresh interpreters and returns its median import time and heaviest packages."""
+    env = {key: value for key, value in os.environ.items() if key not in API_KEY_VARIABLES}
+    times = []
+    heaviest = []
+    for attempt in range(repeat):
+        try:
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", _MEASURE.format(module=module)],
+                cwd=REPO_DIR, env=env, capture_output=True, text=True, timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return {"error": f"import did not finish within {timeout}s"}
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit status {result.returncode}"
+            return {"error": error}
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+        if attempt == 0:
+            heaviest = _parse_importtime(result.stderr, top)
+    return {
+        "median_seconds": round(statistics.median(times), 4),
+        "min_seconds": round(min(times), 4),
+        "heaviest_packages": heaviest,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Returns a message for every entry point that regressed against the baseline report."""
+    regressions = []
+    for module, result in report["entry_points"].items():
+        before = baseline.get("entry_points", {}).get(module)
+        if not before:
+            continue
+        if "error" in result and "error" not in before:
+            regressions.append(f"{module}: no longer imports ({result['error']})")
+        elif "error" not in result and "error" not in before:
+            if result["median_seconds"] > before["median_seconds"] * (1 + tolerance):
+                regressions.append(f"{module}: {result['median_seconds']}s vs. {before['median_seconds']}s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time benchmark of the entry points.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Entry points to measure (default: all).")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per entry point.")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds after which an import counts as failed.")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", default=None, help="Earlier report to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown against the baseline.")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "entry_points": {}}
+    for module in args.modules:
+        result = measure(module, repeat=args.repeat, timeout=args.timeout)
+        report["entry_points"][module] = result
+        if "error" in result:
+            print(f"{module}: failed to import ({result['error']})", flush=True)
+        else:
+            print(f"{module}: {result['median_seconds'] * 1000:.0f} ms", flush=True)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.report}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+Offline end-to-end benchmark of the research pipeline.
+
+Runs every stage, from the reference crawl to the review PDF, against local stand-ins
+for Serper, the PDF hosts, Sci-Hub and OpenAI (see fake_services.py), so results are
+reproducible and cost nothing. Reports per-stage wall time, throughput, latency
+percentiles of papers and outbound calls, and peak memory (including child processes).
+
+    python -m benchmarks.run_benchmark --report bench.json
+    python -m benchmarks.run_benchmark --baseline bench.json --tolerance 0.2
+
+With --baseline, the run fails (exit status 1) if a stage got slower, or its throughput
+dropped, by more than the tolerance. Every run fails if the crawl collected less than half
+of the papers it should have, since its measurements would then cover only a few papers.
+
+--record stores every external call of the run in a cassette (see tools/cassette.py);
+--replay runs the pipeline from such a cassette without starting the stand-ins, with the
+recorded latencies or, with --replay-latency zero, none at all:
+
+    python -m benchmarks.run_benchmark --record bench.cassette
+    python -m benchmarks.run_benchmark --replay bench.cassette --replay-latency zero
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import psutil
+from benchmarks.corpus import build_corpus, crawl_size
+from benchmarks.fake_services import FakeServices, ServiceConfig
+from tools import cassette
+
+# Recorded requests are matched by URL, so recording and replay use the same fixed port.
+CASSETTE_PORT = 18765
+
+# A crawl collecting less than this share of the papers reachable in the corpus fails the run: its numbers
+# would describe a handful of papers (e.g. if references no longer match the corpus titles).
+MIN_CRAWL_SHARE = 0.5
+
+# Spans whose durations are reported as latency percentiles.
+LATENCY_SPANS = ["download_paper", "extract_references", "extract_paper", "summarize_paper", "write_review", "outbound_call"]
+
+
+class PeakMemorySampler:
+    """Samples the RSS of this process and its children from a background thread and keeps the maximum."""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rss(self):
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, self._rss())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles of values, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] for p in points}
+    result["count"] = len(ordered)
+    return result
+
+
+def span_latencies(spans):
+    """Latency percentiles per span name; outbound calls are broken down per service."""
+    durations = {}
+    for record in spans:
+        name = record["name"]
+        if name not in LATENCY_SPANS:
+            continue
+        if name == "outbound_call":
+            name = f"outbound_call:{record['attributes'].get('service')}"
+        durations.setdefault(name, []).append(record["duration"])
+    return {name: percentiles(values) for name, values in sorted(durations.items())}
+
+
+def _count_items(path):
+    if os.path.isdir(path):
+        return len([name for name in os.listdir(path) if name.lower().endswith(".pdf")])
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return len(json.load(f))
+    except (OSError, ValueError):
+        return 0
+
+
+def run_stage(name, fn, items_path, telemetry):
+    """Runs one stage and returns its measurements."""
+    telemetry.reset()
+    with PeakMemorySampler() as memory:
+        started = time.perf_counter()
+        fn()
+        wall = time.perf_counter() - started
+    items = _count_items(items_path) if items_path else 1
+    result = {
+        "wall_seconds": round(wall, 3),
+        "items": items,
+        "items_per_second": round(items / wall, 3) if wall else None,
+        "peak_rss_mb": round(memory.peak / 2 ** 20, 1),
+        "latency_seconds": span_latencies(telemetry.snapshot()["spans"]),
+    }
+    print(f"{name}: {items} items in {wall:.1f}s, peak RSS {result['peak_rss_mb']} MB", flush=True)
+    return result
+
+
+def check_crawl(references_file, expected):
+    """Returns a message if the crawl collected far fewer papers than expected, else None."""
+    collected = _count_items(references_file)
+    if collected < expected * MIN_CRAWL_SHARE:
+        return (f"the crawl collected {collected} papers, expected about {expected}. "
+                "References of the synthetic papers are probably not found by the Scholar stand-in.")
+    return None
+
+
+def compare(report, baseline, tolerance):
+    """Returns a message for every stage that regressed against the baseline report."""
+    regressions = []
+    for name, stage in report["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        if stage["wall_seconds"] > before["wall_seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: wall time {stage['wall_seconds']}s vs. {before['wall_seconds']}s")
+        if before.get("items_per_second") and (stage["items_per_second"] or 0) < before["items_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {stage['items_per_second']}/s vs. {before['items_per_second']}/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the research pipeline.")
+    parser.add_argument("--papers", type=int, default=120, help="Size of the synthetic corpus.")
+    parser.add_argument("--max-papers", type=int, default=None, help="Crawl limit (default: deep_reference_scraper.MAX_PAPERS).")
+    parser.add_argument("--mode", choices=["sequential", "pipelined"], default="sequential")
+    parser.add_argument("--batch", action="store_true", help="Summarize through the Batch API.")
+    parser.add_argument("--serper-latency", type=float, default=0.05)
+    parser.add_argument("--serper-rate-limit", type=float, default=10.0, help="Requests per second before the stub answers 429.")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="Time to first token of the stub.")
+    parser.add_argument("--openai-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--pdf-latency", type=float, default=0.05)
+    parser.add_argument("--scihub-fraction", type=float, default=0.2, help="Share of papers only reachable through Sci-Hub.")
+    parser.add_argument("--html-fraction", type=float, default=0.1,
+                        help="Share of papers only linked from an article page, which is read with Selenium (needs Chrome).")
+    parser.add_argument("--unthrottled", action="store_true",
+                        help="Lift the client-side rate limits of tools/outbound.py to measure the pipeline itself.")
+    parser.add_argument("--record", default=None, help="Record all external calls into this cassette.")
+    parser.add_argument("--replay", default=None, help="Replay external calls from this cassette.")
+    parser.add_argument("--replay-latency", choices=["original", "zero"], default="original")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"Port of the stand-ins (default: a free port, or {CASSETTE_PORT} with --record/--replay).")
+    parser.add_argument("--output-dir", default=None,
+                        help="Run directory, which must be new or empty (default: a temporary directory).")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--baseline", default=None, help="Earlier report to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline.")
+    args = parser.parse_args(argv)
+    # Stage manifests of an earlier run would make stages reuse its outputs instead of doing the work.
+    if args.output_dir and os.path.exists(args.output_dir) and (
+        not os.path.isdir(args.output_dir) or os.listdir(args.output_dir)
+    ):
+        parser.error(f"--output-dir {args.output_dir} is not an empty directory.")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = ServiceConfig(
+        serper_latency=args.serper_latency,
+        serper_rate_limit=args.serper_rate_limit,
+        openai_latency=args.openai_latency,
+        openai_tokens_per_second=args.openai_tokens_per_second,
+        pdf_latency=args.pdf_latency,
+        scihub_fraction=args.scihub_fraction,
+        html_fraction=args.html_fraction,
+    )
+    port = args.port
+    if port is None:
+        port = CASSETTE_PORT if args.record or args.replay else 0
+    services = None
+    if args.replay:
+        base_url = f"http://127.0.0.1:{port}"
+        cassette.use(args.replay, "replay", args.replay_latency)
+    else:
+        services = FakeServices(config, num_papers=args.papers, port=port).start()
+        base_url = services.base_url
+        if args.record:
+            cassette.use(args.record, "record")
+
+    # The pipeline modules read the service endpoints at import time, so the
+    # environment has to point at the stand-ins before they are imported.
+    os.environ["SERPER_API_KEY"] = "benchmark"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ["SERPER_SCHOLAR_URL"] = f"{base_url}/scholar"
+    os.environ["SCIHUB_BASE_URL"] = f"{base_url}/scihub"
+
+    import deep_reference_scraper
+    import review_writer_agent
+    from download_all_papers import download_all_papers
+    from extract_all_data_to_json import main as extract_all
+    from summary_agent import generate_summaries, generate_summaries_batch
+    from pipeline import run_pipeline
+    from tools import outbound, telemetry
+
+    if args.max_papers is not None:
+        deep_reference_scraper.MAX_PAPERS = args.max_papers
+    if args.unthrottled:
+        for limits in outbound.RATE_LIMITS.values():
+            limits["rate"], limits["burst"] = 1000.0, 1000
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="deep_research_bench_")
+    os.makedirs(output_dir, exist_ok=True)
+    topic = "benchmark topic"
+    papers_dir = os.path.join(output_dir, "research_papers")
+    references_file = os.path.join(output_dir, "deep_reference_results.json")
+    content_file = os.path.join(output_dir, "all_research_content.json")
+    summaries_file = os.path.join(output_dir, "summaries.json")
+    quiet = lambda message: None
+
+    def summarize():
+        if args.batch:
+            generate_summaries_batch(json_file=content_file, output_file=summaries_file, poll_interval=1, log_fn=quiet)
+        else:
+            generate_summaries(json_file=content_file, output_file=summaries_file, log_fn=quiet)
+
+    if args.mode == "pipelined":
+        stages = [
+            ("pipelined_research", lambda: run_pipeline(topic, output_dir, log_fn=quiet), summaries_file),
+        ]
+    else:
+        stages = [
+            ("reference_scraper", lambda: deep_reference_scraper.main(topic, output_dir, log_fn=quiet), references_file),
+            ("downloader", lambda: download_all_papers(references_file, papers_dir, log_fn=quiet), papers_dir),
+            ("pdf_extraction", lambda: extract_all(papers_dir, content_file, log_fn=quiet), content_file),
+            ("summarizer", summarize, summaries_file),
+        ]
+    stages.append(("review_writer", lambda: review_writer_agent.main(output_dir, log_fn=quiet), None))
+
+    report = {
+        "settings": {key: value for key, value in vars(args).items() if key not in ("report", "baseline", "output_dir", "record", "replay")},
+        "output_dir": output_dir,
+        "stages": {},
+    }
+    try:
+        started = time.perf_counter()
+        for name, fn, items_path in stages:
+            report["stages"][name] = run_stage(name, fn, items_path, telemetry)
+        report["total_wall_seconds"] = round(time.perf_counter() - started, 3)
+    finally:
+        if services is not None:
+            services.stop()
+        cassette.stop()
+    if services is not None:
+        report["service_requests"] = dict(services.stats)
+    expected_papers = crawl_size(build_corpus(args.papers), deep_reference_scraper.MAX_PAPERS, deep_reference_scraper.MAX_LEVEL)
+    crawl_problem = check_crawl(references_file, expected_papers)
+    report["papers_collected"] = _count_items(references_file)
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Report saved to {args.report}")
+    else:
+        print(text)
+
+    if crawl_problem:
+        print(f"Error: {crawl_problem}")
+        return 1
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
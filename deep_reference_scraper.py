@@ -2,49 +2,19 @@ import os
 import json
 import time
 from tools.top3_scholar_results import search_google_scholar, extract_research_info  # Existing code for Scholar queries :contentReference[oaicite:0]{index=0}
-from tools.pdf_download_scraper import download_pdf, get_scihub_pdf, get_pdf_from_html  # Existing PDF download utilities :contentReference[oaicite:1]{index=1}
 from tools.extract_data_from_pdf import process_pdf_with_unstructured, extract_references  # Existing PDF parsing functions :contentReference[oaicite:2]{index=2}
+# Shares file naming with the download stage, so PDFs fetched during the crawl are reused there.
+from download_all_papers import download_paper_pdf
+from stage_cache import StageManifest
+from tools import telemetry, profiling
 
 # Global variables
 processed_papers = {}  # Dictionary to keep track of processed papers (keyed by DOI or title)
+crawl_errors = []      # Failed searches and downloads of the current crawl
 MAX_PAPERS = 100    # Maximum number of papers to collect
 MAX_LEVEL = 3          # Maximum BFS levels (depth)
 
-def download_paper_pdf(paper, output_folder, log_fn=print):
-    title = paper.get("title", "paper").replace(" ", "_")
-    # Ensure the output folder exists.
-    os.makedirs(output_folder, exist_ok=True)
-    local_pdf = os.path.join(output_folder, f"{title}.pdf")
-    if os.path.exists(local_pdf):
-        log_fn(f"PDF for '{title}' already exists in {output_folder}.")
-        return local_pdf
-
-    pdf_url = paper.get("pdf_url")
-    html_url = paper.get("html_url")
-    doi = paper.get("doi")
-    
-    if pdf_url:
-        log_fn(f"Downloading direct PDF for '{title}'...")
-        download_pdf(pdf_url, local_pdf, log_fn=log_fn)
-    elif html_url:
-        log_fn(f"Scraping PDF from HTML for '{title}'...")
-        pdf_url = get_pdf_from_html(html_url, log_fn=log_fn)
-        if pdf_url:
-            download_pdf(pdf_url, local_pdf, log_fn=log_fn)
-    elif doi:
-        log_fn(f"Using Sci-Hub for DOI '{doi}' for '{title}'...")
-        pdf_url = get_scihub_pdf(doi, log_fn=log_fn)
-        if pdf_url:
-            download_pdf(pdf_url, local_pdf, log_fn=log_fn)
-    else:
-        log_fn(f"No PDF source available for '{title}'.")
-        return None
-
-    if os.path.exists(local_pdf):
-        return local_pdf
-    return None
-
-
+@telemetry.traced("extract_references")
 def extract_references_from_pdf(pdf_path):
     """
     Processes a PDF file to extract and return a list of reference strings.
@@ -74,7 +44,11 @@ def extract_references_from_pdf(pdf_path):
     return filtered_references
 
 
-def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print):
+def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print, on_paper=None):
+    """
+    Breadth-first crawl over the references of the seed papers. If on_paper is given,
+    it is called with every newly discovered paper as soon as it is found.
+    """
     level = 1
     queue = seed_papers[:]  # Start with seed papers
     while queue and level <= MAX_LEVEL and len(processed_papers) < MAX_PAPERS:
@@ -86,6 +60,8 @@ def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print):
             pdf_path = download_paper_pdf(paper, output_folder, log_fn=log_fn)
             if not pdf_path:
                 log_fn(f"Skipping '{title}' due to missing PDF.")
+                if paper.get("pdf_url") or paper.get("html_url") or paper.get("doi"):
+                    crawl_errors.append(f"Download of '{title}' failed.")
                 continue
 
             references = extract_references_from_pdf(pdf_path)
@@ -93,7 +69,7 @@ def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print):
             for ref in references:
                 if len(processed_papers) >= MAX_PAPERS:
                     break
-                results = search_google_scholar(ref, api_key, log_fn=log_fn)
+                results = search_google_scholar(ref, api_key, log_fn=log_fn, errors=crawl_errors)
                 new_papers = extract_research_info(results)
                 if new_papers:
                     new_paper = new_papers[0]  # Take the top result
@@ -102,6 +78,8 @@ def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print):
                         continue
                     processed_papers[key] = new_paper
                     next_queue.append(new_paper)
+                    if on_paper is not None:
+                        on_paper(new_paper)
                     log_fn(f"Added new paper: {new_paper.get('title')}")
                 else:
                     log_fn(f"No paper found for reference: {ref}")
@@ -109,18 +87,41 @@ def bfs_scrape(seed_papers, api_key, output_folder, log_fn=print):
         level += 1
 
 
-def main(research_topic=None, output_dir=None, log_fn=print):
+@profiling.profiled("reference_scraper")
+def main(research_topic=None, output_dir=None, log_fn=print, on_paper=None):
+    """
+    Searches for seed papers on the research topic, crawls their references and saves
+    all collected papers to deep_reference_results.json. If on_paper is given, it is
+    called with each paper (seeds first) as soon as it is collected, so later stages
+    can start on it before the crawl is finished.
+    """
     import os
     import json
-    SERPER_API_KEY = os.environ["SERPER_API_KEY"]
+    SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
     if not SERPER_API_KEY:
-        print("SERPER_API_KEY is not set in the environment.")
+        log_fn("SERPER_API_KEY is not set in the environment.")
         return
 
     if research_topic is None:
         research_topic = input("Enter your research topic: ")
 
-    results = search_google_scholar(research_topic, SERPER_API_KEY, log_fn=log_fn)
+    # Skip the crawl if it already ran for this topic with the same limits.
+    output_path = os.path.join(output_dir, "deep_reference_results.json")
+    manifest = StageManifest(output_path, {"topic": research_topic, "max_papers": MAX_PAPERS, "max_level": MAX_LEVEL})
+    if manifest.is_complete():
+        with open(output_path, "r", encoding="utf-8") as f:
+            papers = json.load(f)
+        log_fn(f"Reference scraping for '{research_topic}' is unchanged. Reusing {len(papers)} papers from {output_path}.")
+        if on_paper is not None:
+            for paper in papers:
+                on_paper(paper)
+        return
+
+    # Start from an empty set so results of an earlier run in this process are not mixed in.
+    processed_papers.clear()
+    crawl_errors.clear()
+
+    results = search_google_scholar(research_topic, SERPER_API_KEY, log_fn=log_fn, errors=crawl_errors)
     seed_papers = extract_research_info(results)
     
     if not seed_papers:
@@ -137,15 +138,23 @@ def main(research_topic=None, output_dir=None, log_fn=print):
     for paper in seed_papers:
         key = paper.get("doi") or paper.get("title")
         processed_papers[key] = paper
+        if on_paper is not None:
+            on_paper(paper)
 
     # Call bfs_scrape with the output folder.
-    bfs_scrape(seed_papers, SERPER_API_KEY, pdf_output_folder, log_fn=log_fn)
+    bfs_scrape(seed_papers, SERPER_API_KEY, pdf_output_folder, log_fn=log_fn, on_paper=on_paper)
     
     log_fn(f"\nBFS reference scraping complete. Total papers collected: {len(processed_papers)}")
     
-    output_path = os.path.join(output_dir, "deep_reference_results.json")
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(list(processed_papers.values()), f, indent=4)
+    if crawl_errors:
+        # A crawl that lost searches or downloads is incomplete; run it again next time
+        # (e.g. when the step is retried) instead of reusing it.
+        manifest.discard()
+        log_fn(f"{len(crawl_errors)} searches or downloads failed during the crawl, so it will not be reused.")
+    else:
+        manifest.save()
     log_fn("Results saved to deep_reference_results.json")
 
 
@@ -1,23 +1,62 @@
 import os
 import re
 import json
+import threading
+from collections import defaultdict
 from tools.pdf_download_scraper import download_pdf, get_scihub_pdf, get_pdf_from_html
+from tools import telemetry, profiling
+
+# One lock per local PDF path, so concurrent workers never write the same file at once.
+_path_locks = defaultdict(threading.Lock)
+_path_locks_guard = threading.Lock()
+
+def _lock_for_path(path):
+    with _path_locks_guard:
+        return _path_locks[path]
+
+def pdf_path_for_paper(paper, output_folder):
+    """
+    Returns the local path of the PDF for a given paper.
+    Special characters in the title are replaced with underscores.
+    """
+    title = paper.get("title", "paper")
+    # Remove special characters by replacing non-alphanumeric with underscores.
+    safe_title = re.sub(r'[^A-Za-z0-9]+', '_', title)
+    return os.path.join(output_folder, f"{safe_title}.pdf")
+
+def is_valid_pdf(path):
+    """Checks that a file exists and starts with the PDF magic bytes."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(5) == b"%PDF-"
+    except OSError:
+        return False
 
 def download_paper_pdf(paper, output_folder, log_fn=print):
     """
     Downloads the PDF for a given paper and saves it to the specified output folder.
-    Special characters in the title are replaced with underscores.
+    An existing file that is not a valid PDF (e.g. a saved error page) is downloaded again.
+    Safe to call from several threads; downloads of the same paper are serialized.
     """
+    with telemetry.span("download_paper", title=paper.get("title", "paper")) as attributes:
+        with _lock_for_path(pdf_path_for_paper(paper, output_folder)):
+            local_pdf = _download_paper_pdf(paper, output_folder, log_fn=log_fn)
+        attributes["downloaded"] = local_pdf is not None
+        return local_pdf
+
+def _download_paper_pdf(paper, output_folder, log_fn=print):
     os.makedirs(output_folder, exist_ok=True)
     
     title = paper.get("title", "paper")
-    # Remove special characters by replacing non-alphanumeric with underscores.
-    safe_title = re.sub(r'[^A-Za-z0-9]+', '_', title)
-    local_pdf = os.path.join(output_folder, f"{safe_title}.pdf")
+    local_pdf = pdf_path_for_paper(paper, output_folder)
     
     if os.path.exists(local_pdf):
-        log_fn(f"PDF for '{title}' already exists in {output_folder}.")
-        return local_pdf
+        if is_valid_pdf(local_pdf):
+            telemetry.incr("cache_hits_total", artifact="research_papers")
+            log_fn(f"PDF for '{title}' already exists in {output_folder}.")
+            return local_pdf
+        log_fn(f"Existing file for '{title}' is not a valid PDF. Downloading again.")
+        os.remove(local_pdf)
 
     pdf_url = paper.get("pdf_url")
     html_url = paper.get("html_url")
@@ -25,17 +64,17 @@ def download_paper_pdf(paper, output_folder, log_fn=print):
     
     if pdf_url:
         log_fn(f"Downloading direct PDF for '{title}'...")
-        download_pdf(pdf_url, local_pdf)
+        download_pdf(pdf_url, local_pdf, log_fn=log_fn)
     elif html_url:
         log_fn(f"Scraping PDF from HTML for '{title}'...")
-        pdf_url = get_pdf_from_html(html_url)
+        pdf_url = get_pdf_from_html(html_url, log_fn=log_fn)
         if pdf_url:
-            download_pdf(pdf_url, local_pdf)
+            download_pdf(pdf_url, local_pdf, log_fn=log_fn)
     elif doi:
         log_fn(f"Using Sci-Hub for DOI '{doi}' for '{title}'...")
-        pdf_url = get_scihub_pdf(doi)
+        pdf_url = get_scihub_pdf(doi, log_fn=log_fn)
         if pdf_url:
-            download_pdf(pdf_url, local_pdf)
+            download_pdf(pdf_url, local_pdf, log_fn=log_fn)
     else:
         log_fn(f"No PDF source available for '{title}'.")
         return None
@@ -44,10 +83,11 @@ def download_paper_pdf(paper, output_folder, log_fn=print):
         return local_pdf
     return None
 
-def download_all_papers(json_file=None, output_folder=None, log_fn=print):
+@profiling.profiled("downloader")
+def download_all_papers(json_file=None, output_folder=None, log_fn=print, titles=None):
     """
     Reads the JSON file containing the paper references and downloads each PDF
-    to the specified output folder.
+    to the specified output folder. If titles is given, only those papers are downloaded.
     """
     if output_folder is None:
         raise ValueError("An output folder must be provided.")
@@ -58,8 +98,12 @@ def download_all_papers(json_file=None, output_folder=None, log_fn=print):
     with open(json_file, "r", encoding="utf-8") as f:
         papers = json.load(f)
     
+    if titles is not None:
+        titles = set(titles)
+        papers = [paper for paper in papers if paper.get("title", "paper") in titles]
+
     for paper in papers:
-        download_paper_pdf(paper, output_folder, log_fn=print)
+        download_paper_pdf(paper, output_folder, log_fn=log_fn)
 
 if __name__ == "__main__":
     download_all_papers()
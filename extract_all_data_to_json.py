@@ -1,6 +1,8 @@
 import os
 import json
-from tools.extract_data_from_pdf import process_pdf_with_unstructured, extract_references
+from tools.extract_data_from_pdf import process_pdf_with_unstructured, extract_references, PARTITION_OPTIONS
+from stage_cache import StageManifest, file_fingerprint
+from tools import telemetry, profiling
 
 def extract_content_from_pdf(pdf_path):
     """
@@ -26,18 +28,21 @@ def extract_content_from_pdf(pdf_path):
     research_content, _ = extract_references(combined_text)
     return research_content
 
-def extract_all_contents(input_folder, log_fn=print):
+def extract_all_contents(input_folder, log_fn=print, filenames=None):
     """
     Iterates over each PDF in the input folder, extracts its research content,
     and stores it in a dictionary where the key is the sanitized filename (without extension)
-    and the value is the extracted content.
+    and the value is the extracted content. If filenames is given, only those PDFs are processed.
     """
     all_contents = {}
     for filename in os.listdir(input_folder):
+        if filenames is not None and filename not in filenames:
+            continue
         if filename.lower().endswith(".pdf"):
             pdf_path = os.path.join(input_folder, filename)
             try:
-                content = extract_content_from_pdf(pdf_path)
+                with telemetry.span("extract_paper", filename=filename):
+                    content = extract_content_from_pdf(pdf_path)
                 # Sanitize filename by removing extension.
                 key = os.path.splitext(filename)[0]
                 all_contents[key] = content
@@ -46,13 +51,74 @@ def extract_all_contents(input_folder, log_fn=print):
                 log_fn(f"Error extracting from {filename}: {e}")
     return all_contents
 
-def main(input_folder, output_file,log_fn=print):
-    # Extract all research content from the PDFs.
-    data = extract_all_contents(input_folder, log_fn=log_fn)
-    
+def plan_extraction(input_folder, output_file, filenames=None):
+    """
+    Works out which PDFs in input_folder need to be extracted.
+
+    Each PDF's content hash is recorded in the stage manifest next to output_file, and
+    PDFs that are unchanged since the last run are reused from the existing output. If
+    filenames is given, exactly those PDFs are extracted and the rest of the existing
+    output is kept.
+
+    Returns:
+        tuple: (manifest, reused content by key, {filename: PDF fingerprint} to extract)
+    """
+    manifest = StageManifest(output_file, {"partition_options": PARTITION_OPTIONS})
+    existing = {}
+    if os.path.exists(output_file):
+        with open(output_file, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+
+    data = {}
+    pending = {}
+    for filename in sorted(os.listdir(input_folder)):
+        if not filename.lower().endswith(".pdf"):
+            continue
+        key = os.path.splitext(filename)[0]
+        pdf_fingerprint = file_fingerprint(os.path.join(input_folder, filename))
+        if filenames is not None:
+            if filename in filenames:
+                pending[filename] = pdf_fingerprint
+            elif key in existing:
+                data[key] = existing[key]
+        elif key in existing and manifest.is_current(key, pdf_fingerprint):
+            data[key] = existing[key]
+        else:
+            pending[filename] = pdf_fingerprint
+    return manifest, data, pending
+
+def save_extraction(output_file, manifest, data, pending, extracted, log_fn=print):
+    """
+    Merges newly extracted content into the reused content, writes output_file and
+    records the fingerprints of the PDFs that were extracted successfully.
+    """
+    for filename, pdf_fingerprint in pending.items():
+        key = os.path.splitext(filename)[0]
+        if key in extracted:
+            manifest.record(key, pdf_fingerprint)
+        else:
+            manifest.forget(key)
+    data = dict(data, **extracted)
+    manifest.retain(data)
+
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+    manifest.save()
     log_fn(f"Saved all research content to {output_file}")
 
+@profiling.profiled("pdf_extraction")
+def main(input_folder, output_file, log_fn=print, filenames=None):
+    """
+    Extracts the research content of the new or changed PDFs in input_folder into
+    output_file (see plan_extraction).
+    """
+    manifest, data, pending = plan_extraction(input_folder, output_file, filenames=filenames)
+    if data:
+        log_fn(f"Reusing content of {len(data)} unchanged PDFs from {output_file}")
+
+    # Extract research content from the new or changed PDFs.
+    extracted = extract_all_contents(input_folder, log_fn=log_fn, filenames=set(pending))
+    save_extraction(output_file, manifest, data, pending, extracted, log_fn=log_fn)
+
 if __name__ == "__main__":
     main()
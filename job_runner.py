@@ -0,0 +1,330 @@
+import os
+import time
+import atexit
+import sqlite3
+import secrets
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# Number of research runs that may execute at the same time, one worker process each.
+MAX_CONCURRENT_RUNS = int(os.environ.get("DEEP_RESEARCH_MAX_CONCURRENT_RUNS", "2"))
+# Submissions are rejected once this many jobs are waiting, so a burst of users can't pile up work.
+MAX_QUEUED_JOBS = int(os.environ.get("DEEP_RESEARCH_MAX_QUEUED_JOBS", "20"))
+POLL_INTERVAL = 2.0           # Seconds an idle worker waits before checking the queue again.
+SUPERVISE_INTERVAL = 10.0     # Seconds between checks that all worker processes are alive.
+MAX_JOB_ATTEMPTS = 2          # Runs whose worker died this often are failed instead of requeued.
+PARTIAL_OUTPUT_INTERVAL = 1.0  # Minimum seconds between writes of streamed LLM output.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT,
+    research_topic TEXT NOT NULL,
+    output_dir TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    partial_output TEXT NOT NULL DEFAULT '',
+    result_pdf TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_logs_job_id ON job_logs (job_id, id);
+"""
+# Columns added after the first release, for databases created before them.
+_ADDED_COLUMNS = {
+    "token": "TEXT",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class JobStore:
+    """
+    Persistent job table backed by a local SQLite database.
+    Each call opens its own connection, so a store can be shared by threads and
+    recreated in worker processes from the database path alone.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_token ON jobs (token)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, research_topic, jobs_dir):
+        """
+        Queues a research run and returns its job id. Each job writes to its own folder in jobs_dir
+        and gets a random token, which is what users see (see get_by_token); ids are guessable.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= MAX_QUEUED_JOBS:
+                conn.execute("ROLLBACK")
+                raise RuntimeError(f"Too many research runs are waiting ({queued}). Please try again later.")
+            job_id = conn.execute(
+                "INSERT INTO jobs (token, research_topic, created_at) VALUES (?, ?, ?)",
+                (secrets.token_urlsafe(16), research_topic, time.time()),
+            ).lastrowid
+            output_dir = os.path.join(os.path.abspath(jobs_dir), f"job_{job_id}")
+            conn.execute("UPDATE jobs SET output_dir = ? WHERE id = ?", (output_dir, job_id))
+            conn.execute("COMMIT")
+        return job_id
+
+    def claim_next(self, worker_pid):
+        """Marks the oldest queued job as running for the given worker and returns it, or None."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_pid = ?, started_at = ? WHERE id = ?",
+                (worker_pid, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        return dict(row)
+
+    def finish(self, job_id, result_pdf=None, error=None):
+        status = "failed" if error else "done"
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result_pdf = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result_pdf, error, time.time(), job_id),
+            )
+
+    def append_log(self, job_id, message):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job_logs (job_id, created_at, message) VALUES (?, ?, ?)",
+                (job_id, time.time(), str(message)),
+            )
+
+    def set_partial_output(self, job_id, text):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET partial_output = ? WHERE id = ?", (text, job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_by_token(self, token):
+        """Returns the job with the given token, or None for an unknown or malformed token."""
+        if not isinstance(token, str) or not token:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE token = ?", (token,)).fetchone()
+        return dict(row) if row else None
+
+    def logs(self, job_id, after_id=0):
+        """Returns the (log id, message) pairs of a job newer than after_id."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, message FROM job_logs WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after_id),
+            ).fetchall()
+        return [(row["id"], row["message"]) for row in rows]
+
+    def queue_position(self, job_id):
+        """Number of queued jobs ahead of the given job."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id < ?", (job_id,)
+            ).fetchone()[0]
+
+    def requeue_orphaned(self):
+        """
+        Puts running jobs whose worker process no longer exists back in the queue. A job whose
+        worker died MAX_JOB_ATTEMPTS times (e.g. killed for running out of memory) is failed.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, worker_pid, attempts FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if _pid_alive(row["worker_pid"]):
+                    continue
+                if row["attempts"] >= MAX_JOB_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', worker_pid = NULL, error = ?, finished_at = ? WHERE id = ?",
+                        ("The worker process running this job exited unexpectedly.", now, row["id"]),
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL WHERE id = ?",
+                        (row["id"],),
+                    )
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_job(store, job):
+    """Runs one research job with ManagerAgent, recording logs and streamed output in the store."""
+    # Imported here so the job table can be used without loading the pipeline.
+    from manager_agent import ManagerAgent
+
+    job_id = job["id"]
+    stream_state = {"text": "", "written_at": 0.0}
+
+    def log_fn(message):
+        # A log line ends the current streamed section; write out its final text.
+        if stream_state["text"]:
+            store.set_partial_output(job_id, stream_state["text"])
+            stream_state["text"] = ""
+        store.append_log(job_id, message)
+
+    def stream_fn(delta):
+        stream_state["text"] += delta
+        now = time.monotonic()
+        if now - stream_state["written_at"] >= PARTIAL_OUTPUT_INTERVAL:
+            stream_state["written_at"] = now
+            store.set_partial_output(job_id, stream_state["text"])
+
+    os.makedirs(job["output_dir"], exist_ok=True)
+    try:
+        manager = ManagerAgent(job["research_topic"], log_fn=log_fn, output_dir=job["output_dir"], stream_fn=stream_fn)
+        manager.run()
+    except Exception as e:
+        log_fn(f"Research run failed: {e}")
+        store.finish(job_id, error=str(e))
+        return
+
+    result_pdf = os.path.join(job["output_dir"], "review_paper.pdf")
+    if os.path.exists(result_pdf):
+        store.finish(job_id, result_pdf=result_pdf)
+    else:
+        store.finish(job_id, error="No review paper was generated.")
+
+
+def worker_loop(db_path, stop_event=None):
+    """
+    Pulls queued jobs from the store and runs them one at a time until stop_event is set,
+    or until the process that started the worker is gone.
+    """
+    store = JobStore(db_path)
+    parent_pid = os.getppid()
+    while (stop_event is None or not stop_event.is_set()) and os.getppid() == parent_pid:
+        job = store.claim_next(os.getpid())
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(store, job)
+
+
+class JobRunner:
+    """
+    Bounded pool of worker processes executing research jobs from a JobStore.
+    At most max_workers runs execute at once; further submissions wait in the queue.
+    A supervisor thread replaces workers that died (e.g. out of memory or a crash in a
+    native library) and requeues the jobs they were running.
+    """
+    def __init__(self, db_path, max_workers=MAX_CONCURRENT_RUNS):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.store = JobStore(db_path)
+        self._stop_event = multiprocessing.Event()
+        self._workers = []
+        self._supervisor = None
+        self._lock = threading.Lock()
+
+    def _start_worker(self):
+        # Workers are not daemonic, so they may start their own process pools.
+        worker = multiprocessing.Process(target=worker_loop, args=(self.db_path, self._stop_event))
+        worker.start()
+        return worker
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            self.store.requeue_orphaned()
+            self._workers = [self._start_worker() for _ in range(self.max_workers)]
+            self._supervisor = threading.Thread(target=self._supervise, name="job-supervisor", daemon=True)
+            self._supervisor.start()
+            # Workers are not daemonic, so multiprocessing joins them when the interpreter exits;
+            # stop them first, or a process that started a runner would never exit.
+            atexit.register(self.stop)
+
+    def _supervise(self):
+        while not self._stop_event.wait(SUPERVISE_INTERVAL):
+            self.check_workers()
+
+    def check_workers(self):
+        """Replaces dead worker processes and requeues (or fails) the jobs they left running."""
+        with self._lock:
+            if self._stop_event.is_set() or not self._workers:
+                return
+            # is_alive() also reaps exited workers, whose pids would otherwise still look alive.
+            alive = [worker for worker in self._workers if worker.is_alive()]
+            for _ in range(self.max_workers - len(alive)):
+                alive.append(self._start_worker())
+            self._workers = alive
+        self.store.requeue_orphaned()
+
+    def join(self):
+        """Waits until the runner is stopped and all worker processes have exited."""
+        while not self._stop_event.wait(SUPERVISE_INTERVAL):
+            pass
+        for worker in list(self._workers):
+            worker.join()
+
+    def stop(self, timeout=None):
+        """Asks the workers to exit once their current job is finished and waits for them."""
+        with self._lock:
+            self._stop_event.set()
+            for worker in self._workers:
+                worker.join(timeout)
+            self._workers = []
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run research jobs queued by the Streamlit app.")
+    parser.add_argument("--db", default=os.path.join("jobs", "jobs.sqlite3"), help="Path to the job database.")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_RUNS, help="Number of concurrent runs.")
+    args = parser.parse_args()
+
+    runner = JobRunner(args.db, max_workers=args.workers)
+    runner.start()
+    try:
+        runner.join()
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+if __name__ == "__main__":
+    main()
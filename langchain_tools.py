@@ -1,14 +1,26 @@
-from langchain.tools import tool
+import json
 from agents import (
     ReferenceScraperAgent,
     DownloaderAgent,
     PDFExtractionAgent,
     SummarizerAgent,
     ReviewWriterAgent,
+    PipelinedResearchAgent,
 )
 
+def _tool():
+    """LangChain's tool decorator, imported on first use so that importing this module stays cheap."""
+    from langchain.tools import tool
+    return tool()
+
+def _parse_retry_items(input: str):
+    """Parses the optional JSON list of items to retry. An empty input means all items."""
+    if not input or not input.strip():
+        return None
+    return json.loads(input)
+
 def create_reference_scraper_tool(output_dir: str, log_fn=print):
-    @tool()
+    @_tool()
     def reference_scraper_tool(input: str) -> str:
         """Scrapes references from a research topic using deep_reference_scraper. Input: a research topic string."""
         agent = ReferenceScraperAgent(output_dir=output_dir, log_fn=log_fn)
@@ -16,38 +28,47 @@ def create_reference_scraper_tool(output_dir: str, log_fn=print):
         return f"Reference scraping complete. Output saved to: {agent.output_file}"
     return reference_scraper_tool
 
-def create_downloader_tool(output_dir: str, log_fn=print):
-    @tool()
+def create_downloader_tool(output_dir: str, log_fn=print, task_queue=None):
+    @_tool()
     def downloader_tool(input: str = "") -> str:
-        """Downloads PDFs based on scraped references. No input needed."""
-        agent = DownloaderAgent(output_dir=output_dir, log_fn=log_fn)
-        agent.run()
+        """Downloads PDFs based on scraped references. Optional input: a JSON list of paper titles to retry."""
+        agent = DownloaderAgent(output_dir=output_dir, log_fn=log_fn, task_queue=task_queue)
+        agent.run(titles=_parse_retry_items(input))
         return f"Download complete. PDFs saved in: {agent.output_folder}"
     return downloader_tool
 
-def create_pdf_extraction_tool(output_dir: str, log_fn=print):
-    @tool()
+def create_pdf_extraction_tool(output_dir: str, log_fn=print, task_queue=None):
+    @_tool()
     def pdf_extraction_tool(input: str = "") -> str:
-        """Extracts research content from downloaded PDFs and saves it to a JSON file. No input needed."""
-        agent = PDFExtractionAgent(output_dir=output_dir, log_fn=log_fn)
-        agent.run()
+        """Extracts research content from downloaded PDFs and saves it to a JSON file. Optional input: a JSON list of PDF filenames to retry."""
+        agent = PDFExtractionAgent(output_dir=output_dir, log_fn=log_fn, task_queue=task_queue)
+        agent.run(filenames=_parse_retry_items(input))
         return f"PDF extraction complete. Output saved to: {agent.output_file}"
     return pdf_extraction_tool
 
-def create_summarizer_tool(output_dir: str, log_fn=print):
-    @tool()
+def create_summarizer_tool(output_dir: str, log_fn=print, stream_fn=None, task_queue=None, batch=False):
+    @_tool()
     def summarizer_tool(input: str = "") -> str:
-        """Generates summaries for the extracted research content. No input needed."""
-        agent = SummarizerAgent(output_dir=output_dir, log_fn=log_fn)
-        agent.run()
+        """Generates summaries for the extracted research content. Optional input: a JSON list of paper keys to retry."""
+        agent = SummarizerAgent(output_dir=output_dir, log_fn=log_fn, batch=batch, stream_fn=stream_fn, task_queue=task_queue)
+        agent.run(paper_keys=_parse_retry_items(input))
         return f"Summaries generated. Output saved to: {agent.output_file}"
     return summarizer_tool
 
-def create_review_writer_tool(output_dir: str, log_fn=print):
-    @tool()
+def create_pipelined_research_tool(output_dir: str, log_fn=print, stream_fn=None):
+    @_tool()
+    def pipelined_research_tool(input: str) -> str:
+        """Scrapes, downloads, extracts and summarizes papers for a research topic as one pipeline. Input: a research topic string."""
+        agent = PipelinedResearchAgent(output_dir=output_dir, log_fn=log_fn, stream_fn=stream_fn)
+        agent.run(input)
+        return f"Pipelined research complete. Summaries saved to: {agent.output_file}"
+    return pipelined_research_tool
+
+def create_review_writer_tool(output_dir: str, log_fn=print, stream_fn=None):
+    @_tool()
     def review_writer_tool(input: str = "") -> str:
         """Generates the final review paper using the summaries. No input needed."""
-        agent = ReviewWriterAgent(output_dir=output_dir, log_fn=log_fn)
+        agent = ReviewWriterAgent(output_dir=output_dir, log_fn=log_fn, stream_fn=stream_fn)
         agent.run()
         return f"Review paper generated. Output saved as: {agent.output_file}"
     return review_writer_tool
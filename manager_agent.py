@@ -1,8 +1,5 @@
 import os
-from langchain_openai import OpenAI  # Updated import for LangChain v0.3
-from langchain.prompts import PromptTemplate
-from langchain.chains.llm import LLMChain  # Updated import for LangChain v0.3
-
+import json
 # Use the factory functions from langchain_tools.py
 from langchain_tools import (
     create_reference_scraper_tool,
@@ -10,99 +7,199 @@ from langchain_tools import (
     create_pdf_extraction_tool,
     create_summarizer_tool,
     create_review_writer_tool,
+    create_pipelined_research_tool,
+)
+from tools import telemetry, profiling, clients, outbound, cassette
+from quality_gates import (
+    reference_scraper_gate,
+    downloader_gate,
+    pdf_extraction_gate,
+    summarization_gate,
+    review_writer_gate,
 )
-
-OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 
 class ManagerAgent:
-    def __init__(self, research_topic: str, log_fn=print, output_dir: str = None):
+    def __init__(self, research_topic: str, log_fn=print, output_dir: str = None, stream_fn=None, pipelined: bool = False,
+                 task_queue=None, metrics_port: int = None, profile: bool = False,
+                 batch_summaries: bool = False):
         self.research_topic = research_topic
+        self.pipelined = pipelined
+        # Summarize through the OpenAI Batch API: cheaper, but results may take up to 24 hours.
+        self.batch_summaries = batch_summaries
+        # With a task queue (a task_queue.TaskQueue or another backend with the same methods),
+        # per-paper work is done by task workers (see task_worker.py).
+        self.task_queue = task_queue
+        # Optional Prometheus endpoint (http://<host>:<metrics_port>/metrics) for the running pipeline.
+        self.metrics_port = metrics_port
+        # Sampling CPU/wall-clock profiles of each stage, written to <output_dir>/profiles.
+        self.profile = profile
         self.log_fn = log_fn
+        self.stream_fn = stream_fn
         self.output_dir = output_dir
         print("ManagerAgent using OUTPUT_DIR:", self.output_dir)
-        self.llm = OpenAI(temperature=0.2, api_key=OPENAI_API_KEY)
+        # The LLM judge is built on first use (see decision_chain); with clear gate
+        # verdicts a run may never need it, nor LangChain.
+        self._decision_chain = None
         
-        self.decision_chain = LLMChain(
-            llm=self.llm,
-            prompt=PromptTemplate(
-                input_variables=["step", "output"],
-                template=(
-                    "You just completed the {step} step of a research pipeline. "
-                    "Here is the output:\n{output}\n\n"
-                    "Based on this, should we proceed to the next step or revise our approach? "
-                    "Respond with 'proceed' or 'revise' and provide a brief explanation."
-                ),
+        self.max_attempts = 3
+
+    @property
+    def decision_chain(self):
+        if self._decision_chain is None:
+            from langchain_openai import OpenAI  # Updated import for LangChain v0.3
+            from langchain.prompts import PromptTemplate
+            from langchain.chains.llm import LLMChain  # Updated import for LangChain v0.3
+
+            # Retries, timeouts and the circuit breaker come from the outbound layer (see evaluate_step).
+            self.llm = OpenAI(
+                temperature=0.2,
+                api_key=clients.api_key("OPENAI_API_KEY"),
+                max_retries=0,
+                timeout=outbound.OPENAI_TIMEOUT,
+                http_client=cassette.openai_http_client(),
             )
-        )
-        
-        self.revision_chain = LLMChain(
-            llm=self.llm,
-            prompt=PromptTemplate(
-                input_variables=["step", "output"],
-                template=(
-                    "The {step} step produced the following output:\n{output}\n\n"
-                    "It was evaluated as needing revision. Provide concrete suggestions on how to adjust "
-                    "or improve this step to get better results."
-                ),
+            self._decision_chain = LLMChain(
+                llm=self.llm,
+                prompt=PromptTemplate(
+                    input_variables=["step", "output"],
+                    template=(
+                        "You just completed the {step} step of a research pipeline. "
+                        "Here is the output:\n{output}\n\n"
+                        "Based on this, should we proceed to the next step or revise our approach? "
+                        "Respond with 'proceed' or 'revise' and provide a brief explanation."
+                    ),
+                )
             )
-        )
-        
-        self.max_attempts = 3
+        return self._decision_chain
 
-    def evaluate_step(self, step: str, tool_output: str) -> bool:
-        response = self.decision_chain.run(step=step, output=tool_output)
+    def evaluate_step(self, step: str, tool_output: str, gate_result: dict = None) -> bool:
+        """
+        Decides whether a step can proceed. The metric-based gate result decides on its own
+        when it is a clear pass or fail; the LLM judge is only consulted for ambiguous results
+        (or when the step has no gate).
+        """
+        if gate_result is not None:
+            self.log_fn(f"Quality gate for {step}: {gate_result['verdict']} {gate_result['metrics']}")
+            if gate_result["verdict"] != "ambiguous":
+                return gate_result["verdict"] == "pass"
+            tool_output = f"{tool_output}\nMetrics: {json.dumps(gate_result['metrics'])}"
+        decision_chain = self.decision_chain
+        response = outbound.call(
+            "openai", lambda: decision_chain.run(step=step, output=tool_output), log_fn=self.log_fn
+        )
         self.log_fn(f"LLM Evaluation for {step}: {response}")
         return "proceed" in response.lower()
 
-    def run_step_with_guidance(self, step: str, tool, tool_input: str = "") -> str:
+    def run_step_with_guidance(self, step: str, tool, tool_input: str = "", gate=None, check_first: bool = False) -> str:
+        """
+        Runs a step and checks it with its quality gate, retrying up to max_attempts times.
+        When the gate reports failed items, a retry passes only those items to the tool
+        as a JSON list instead of rerunning the whole step.
+
+        With check_first, the gate is checked before the step runs at all: the step is
+        skipped if its output already passes, and otherwise only runs on the failed items.
+        """
         attempts = 0
+        step_input = tool_input
+        if check_first and gate:
+            gate_result = gate(self.output_dir)
+            self.log_fn(f"Quality gate for {step}: {gate_result['verdict']} {gate_result['metrics']}")
+            if gate_result["verdict"] == "pass":
+                return f"{step} output already meets requirements."
+            if gate_result["failed_items"]:
+                step_input = json.dumps(gate_result["failed_items"])
         while attempts < self.max_attempts:
             self.log_fn(f"\n=== Attempt {attempts+1} for step: {step} ===")
-            output = tool(tool_input) if tool_input else tool("")
+            output = tool(step_input) if step_input else tool("")
             self.log_fn(f"Output for {step}:\n{output}")
-            if self.evaluate_step(step, output):
+            gate_result = gate(self.output_dir) if gate else None
+            if self.evaluate_step(step, output, gate_result):
                 return output
+            if gate_result and gate_result["failed_items"]:
+                self.log_fn(f"Retrying {len(gate_result['failed_items'])} failed items for {step}.")
+                step_input = json.dumps(gate_result["failed_items"])
             else:
-                revision_suggestion = self.revision_chain.run(step=step, output=output)
-                self.log_fn(f"Revision suggestions for {step}:\n{revision_suggestion}")
-                attempts += 1
+                step_input = tool_input
+            attempts += 1
         self.log_fn(f"Maximum attempts reached for {step}. Aborting process.")
         raise Exception(f"Step {step} failed to meet requirements after {self.max_attempts} attempts.")
 
     def run(self):
+        """
+        Runs the research process. Its spans and counters are written to trace.json and
+        metrics.prom in the output directory, even if a step fails.
+        """
+        telemetry.reset()
+        if self.metrics_port:
+            # Shared by all runs of the process, e.g. consecutive jobs of a job worker.
+            telemetry.serve_metrics(self.metrics_port)
+        if self.profile:
+            profiling.enable(os.path.join(self.output_dir, "profiles"))
+        try:
+            with telemetry.span("run", research_topic=self.research_topic):
+                self._run_steps()
+        finally:
+            if self.profile:
+                profiling.disable()
+            telemetry.export_trace(os.path.join(self.output_dir, "trace.json"))
+            telemetry.export_prometheus(os.path.join(self.output_dir, "metrics.prom"))
+            self.log_fn(f"Manager Agent: Trace saved to {os.path.join(self.output_dir, 'trace.json')}")
+
+    def _run_steps(self):
         self.log_fn("Manager Agent: Starting the research process.\n")
         
         # Create tool instances using the factory functions
         ref_tool = create_reference_scraper_tool(self.output_dir, self.log_fn)
-        down_tool = create_downloader_tool(self.output_dir, self.log_fn)
-        pdf_tool = create_pdf_extraction_tool(self.output_dir, self.log_fn)
-        sum_tool = create_summarizer_tool(self.output_dir, self.log_fn)
-        rev_tool = create_review_writer_tool(self.output_dir, self.log_fn)
-        
-        ref_result = self.run_step_with_guidance(
-            "Reference Scraper",
-            lambda input: ref_tool(input),
-            self.research_topic
+        down_tool = create_downloader_tool(self.output_dir, self.log_fn, self.task_queue)
+        pdf_tool = create_pdf_extraction_tool(self.output_dir, self.log_fn, self.task_queue)
+        sum_tool = create_summarizer_tool(
+            self.output_dir, self.log_fn, self.stream_fn, self.task_queue, batch=self.batch_summaries
         )
+        rev_tool = create_review_writer_tool(self.output_dir, self.log_fn, self.stream_fn)
+
+        if self.pipelined:
+            # One pipelined pass produces the outputs of the first four stages. The
+            # per-stage steps below then only check them and retry failed items.
+            pipe_tool = create_pipelined_research_tool(self.output_dir, self.log_fn, self.stream_fn)
+            ref_result = self.run_step_with_guidance(
+                "Pipelined Research",
+                lambda input: pipe_tool(input),
+                self.research_topic,
+                gate=reference_scraper_gate,
+            )
+        else:
+            ref_result = self.run_step_with_guidance(
+                "Reference Scraper",
+                lambda input: ref_tool(input),
+                self.research_topic,
+                gate=reference_scraper_gate,
+            )
         
         down_result = self.run_step_with_guidance(
             "Downloader",
-            lambda _: down_tool(""),
+            lambda input: down_tool(input),
+            gate=downloader_gate,
+            check_first=self.pipelined,
         )
         
         pdf_result = self.run_step_with_guidance(
             "PDF Extraction",
-            lambda _: pdf_tool(""),
+            lambda input: pdf_tool(input),
+            gate=pdf_extraction_gate,
+            check_first=self.pipelined,
         )
         
         sum_result = self.run_step_with_guidance(
             "Summarization",
-            lambda _: sum_tool(""),
+            lambda input: sum_tool(input),
+            gate=summarization_gate,
+            check_first=self.pipelined,
         )
         
         self.review_result = self.run_step_with_guidance(
             "Review Writing",
             lambda _: rev_tool(""),
+            gate=review_writer_gate,
         )
         
         self.log_fn("Manager Agent: Research process complete. Check the output folder for results.")
@@ -0,0 +1,169 @@
+import os
+import json
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from deep_reference_scraper import main as run_deep_reference_scraper
+from download_all_papers import download_paper_pdf
+from extract_all_data_to_json import extract_content_from_pdf
+from summary_agent import summarize_text, summary_manifest
+from stage_cache import StageManifest, fingerprint, file_fingerprint
+from tools.extract_data_from_pdf import PARTITION_OPTIONS
+from tools import telemetry, profiling
+
+# Marks the end of a stage's output. Workers put it back on their input queue
+# so every sibling worker of the same stage sees it too.
+_DONE = object()
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _start_stage(name, fn, in_queue, out_queue, workers, log_fn=print):
+    """
+    Starts a pool of worker threads that take items from in_queue, apply fn and put
+    non-None results on out_queue. Once all workers have seen the end marker, the end
+    marker is forwarded to out_queue. Returns the thread that forwards it. Spans recorded
+    by the workers are children of the span active when the stage is started.
+    """
+    def work():
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                in_queue.put(_DONE)
+                return
+            try:
+                result = fn(item)
+            except Exception as e:
+                log_fn(f"{name}: error processing item: {e}")
+                continue
+            if result is not None and out_queue is not None:
+                out_queue.put(result)
+
+    threads = [threading.Thread(target=telemetry.bind(work), name=f"{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    def close():
+        for thread in threads:
+            thread.join()
+        if out_queue is not None:
+            out_queue.put(_DONE)
+
+    closer = threading.Thread(target=close, name=f"{name}-closer", daemon=True)
+    closer.start()
+    return closer
+
+
+@profiling.profiled("pipelined_research")
+def run_pipeline(research_topic, output_dir, log_fn=print, stream_fn=None,
+                 download_workers=8, extract_workers=None, summarize_workers=4, queue_size=16):
+    """
+    Runs crawl -> download -> extract -> summarize as a pipeline instead of one stage after
+    the other. Each paper is handed to the next stage as soon as it is ready, through bounded
+    queues, so network-bound downloads, CPU-bound PDF extraction and LLM-bound summarization
+    overlap. A full queue blocks the stage in front of it, which keeps memory bounded.
+
+    Extraction runs in a pool of worker processes (extract_workers, default: CPU count);
+    the other stages use threads. The same output files as the sequential agents are written:
+    deep_reference_results.json, all_research_content.json and summaries.json, along with
+    their stage manifests, and papers whose fingerprints match are reused instead of
+    being extracted or summarized again.
+    """
+    extract_workers = extract_workers or os.cpu_count() or 1
+    output_folder = os.path.join(output_dir, "research_papers")
+    os.makedirs(output_folder, exist_ok=True)
+
+    download_queue = queue.Queue(maxsize=queue_size)
+    extract_queue = queue.Queue(maxsize=queue_size)
+    summarize_queue = queue.Queue(maxsize=queue_size)
+
+    content_file = os.path.join(output_dir, "all_research_content.json")
+    summaries_file = os.path.join(output_dir, "summaries.json")
+    content_manifest = StageManifest(content_file, {"partition_options": PARTITION_OPTIONS})
+    summaries_manifest = summary_manifest(summaries_file)
+    previous_contents = _load_json(content_file)
+    previous_summaries = _load_json(summaries_file)
+
+    contents = {}
+    summaries = {}
+    results_lock = threading.Lock()
+    # Summaries are written by several workers at once, but stream_fn shows one text: only the
+    # worker holding this lock streams its summary, the others generate theirs without streaming.
+    stream_lock = threading.Lock()
+
+    def crawl():
+        try:
+            run_deep_reference_scraper(research_topic, output_dir=output_dir, log_fn=log_fn, on_paper=download_queue.put)
+        except Exception as e:
+            log_fn(f"Crawl: error during reference scraping: {e}")
+        finally:
+            download_queue.put(_DONE)
+
+    def download(paper):
+        return download_paper_pdf(paper, output_folder, log_fn=log_fn)
+
+    def summarize(item):
+        key, content = item
+        content_fingerprint = fingerprint(content)
+        if previous_summaries.get(key) and summaries_manifest.is_current(key, content_fingerprint):
+            log_fn(f"Summary for {key} is unchanged. Reusing it.")
+            summary = previous_summaries[key]
+        elif not content.strip():
+            log_fn(f"Content for {key} is empty. Skipping.")
+            summary = ""
+        elif stream_fn and stream_lock.acquire(blocking=False):
+            try:
+                summary = summarize_text(content, log_fn=log_fn, stream_fn=stream_fn)
+            finally:
+                stream_lock.release()
+            log_fn(f"Summary for {key} generated.")
+        else:
+            summary = summarize_text(content, log_fn=log_fn)
+            log_fn(f"Summary for {key} generated.")
+        with results_lock:
+            summaries[key] = summary
+            if summary:
+                summaries_manifest.record(key, content_fingerprint)
+            else:
+                summaries_manifest.forget(key)
+
+    with ProcessPoolExecutor(max_workers=extract_workers) as extract_pool:
+        def extract(pdf_path):
+            key = os.path.splitext(os.path.basename(pdf_path))[0]
+            pdf_fingerprint = file_fingerprint(pdf_path)
+            if key in previous_contents and content_manifest.is_current(key, pdf_fingerprint):
+                content = previous_contents[key]
+                log_fn(f"{os.path.basename(pdf_path)} is unchanged. Reusing its content.")
+            else:
+                # Spans recorded in the worker process are lost, so time the whole round trip here.
+                with telemetry.span("extract_paper", filename=os.path.basename(pdf_path)):
+                    content = extract_pool.submit(extract_content_from_pdf, pdf_path).result()
+                log_fn(f"Extracted content from {os.path.basename(pdf_path)}")
+            with results_lock:
+                contents[key] = content
+                content_manifest.record(key, pdf_fingerprint)
+            return key, content
+
+        crawler = threading.Thread(target=telemetry.bind(crawl), name="crawl", daemon=True)
+        crawler.start()
+        _start_stage("Download", download, download_queue, extract_queue, download_workers, log_fn)
+        _start_stage("Extract", extract, extract_queue, summarize_queue, extract_workers, log_fn)
+        _start_stage("Summarize", summarize, summarize_queue, None, summarize_workers, log_fn).join()
+        crawler.join()
+
+    with open(content_file, "w", encoding="utf-8") as f:
+        json.dump(contents, f, indent=4, ensure_ascii=False)
+    content_manifest.retain(contents)
+    content_manifest.save()
+    log_fn(f"Saved all research content to {content_file}")
+
+    with open(summaries_file, "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=4, ensure_ascii=False)
+    summaries_manifest.retain(summaries)
+    summaries_manifest.save()
+    log_fn(f"Summaries saved to {summaries_file}")
@@ -0,0 +1,99 @@
+import os
+import json
+from download_all_papers import pdf_path_for_paper, is_valid_pdf
+
+# A stage passes outright when at most this share of its items failed,
+# and fails outright when none of its items succeeded. Anything in between
+# is ambiguous and left to the LLM judge in ManagerAgent.
+PASS_FAILURE_RATIO = 0.2
+MIN_REFERENCE_PAPERS = 4      # Fewer papers than this means the BFS found no references beyond the seeds.
+MIN_EXTRACTED_CHARS = 500     # Extracted content shorter than this is treated as a failed extraction.
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _gate_result(total, failed_items, metrics):
+    """
+    Builds a gate result from the number of items a stage handled and the items that failed.
+    The verdict is 'pass', 'fail' or 'ambiguous'.
+    """
+    if total == 0 or len(failed_items) == total:
+        verdict = "fail"
+    elif len(failed_items) <= PASS_FAILURE_RATIO * total:
+        verdict = "pass"
+    else:
+        verdict = "ambiguous"
+    metrics = dict(metrics, total=total, failed=len(failed_items))
+    return {"verdict": verdict, "metrics": metrics, "failed_items": failed_items}
+
+
+def reference_scraper_gate(output_dir):
+    """Checks how many papers the reference scraper collected."""
+    papers = _load_json(os.path.join(output_dir, "deep_reference_results.json"), [])
+    metrics = {"papers_found": len(papers)}
+    if not papers:
+        verdict = "fail"
+    elif len(papers) < MIN_REFERENCE_PAPERS:
+        verdict = "ambiguous"
+    else:
+        verdict = "pass"
+    # The crawl can only be rerun as a whole, so there are no individual items to retry.
+    return {"verdict": verdict, "metrics": metrics, "failed_items": []}
+
+
+def downloader_gate(output_dir):
+    """Checks that every scraped paper has a valid PDF. Failed items are paper titles."""
+    papers = _load_json(os.path.join(output_dir, "deep_reference_results.json"), [])
+    output_folder = os.path.join(output_dir, "research_papers")
+    failed = [
+        paper.get("title", "paper")
+        for paper in papers
+        if not is_valid_pdf(pdf_path_for_paper(paper, output_folder))
+    ]
+    return _gate_result(len(papers), failed, {"valid_pdfs": len(papers) - len(failed)})
+
+
+def pdf_extraction_gate(output_dir):
+    """Checks that every valid PDF yielded enough text. Failed items are PDF filenames."""
+    input_folder = os.path.join(output_dir, "research_papers")
+    contents = _load_json(os.path.join(output_dir, "all_research_content.json"), {})
+    filenames = []
+    if os.path.isdir(input_folder):
+        filenames = sorted(
+            name for name in os.listdir(input_folder)
+            if name.lower().endswith(".pdf") and is_valid_pdf(os.path.join(input_folder, name))
+        )
+    failed = []
+    total_chars = 0
+    for filename in filenames:
+        content = contents.get(os.path.splitext(filename)[0], "")
+        total_chars += len(content)
+        if len(content) < MIN_EXTRACTED_CHARS:
+            failed.append(filename)
+    chars_per_paper = total_chars // len(filenames) if filenames else 0
+    return _gate_result(len(filenames), failed, {"chars_per_paper": chars_per_paper})
+
+
+def summarization_gate(output_dir):
+    """Checks that every paper with content got a non-empty summary. Failed items are paper keys."""
+    contents = _load_json(os.path.join(output_dir, "all_research_content.json"), {})
+    summaries = _load_json(os.path.join(output_dir, "summaries.json"), {})
+    keys = [key for key, content in contents.items() if content.strip()]
+    failed = [key for key in keys if not (summaries.get(key) or "").strip()]
+    return _gate_result(len(keys), failed, {"empty_summaries": len(failed)})
+
+
+def review_writer_gate(output_dir):
+    """Checks that the review paper PDF was written."""
+    review_pdf = os.path.join(output_dir, "review_paper.pdf")
+    size = os.path.getsize(review_pdf) if os.path.exists(review_pdf) else 0
+    verdict = "pass" if size > 0 else "fail"
+    return {"verdict": verdict, "metrics": {"review_pdf_bytes": size}, "failed_items": []}
@@ -1,13 +1,8 @@
 import os
 import json
 import re
-from openai import OpenAI
-from fpdf import FPDF
-
-OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
-
-# Initialize the OpenAI client using the new style.
-client = OpenAI(api_key=OPENAI_API_KEY)
+from tools.llm_streaming import stream_chat_completion, record_usage
+from tools import outbound, telemetry, profiling, clients
 
 def train_manager_agent():
     """
@@ -26,10 +21,12 @@ def train_manager_agent():
     )
     return guidelines
 
-def generate_review_paper(summaries, model="gpt-4o", temperature=0.3, max_tokens=5000):
+@telemetry.traced("write_review")
+def generate_review_paper(summaries, model="gpt-4o", temperature=0.3, max_tokens=5000, log_fn=print, stream_fn=None):
     """
     Generates a comprehensive review paper based on provided paper summaries.
     The prompt includes training guidelines to instruct the agent on how to write a good review.
+    If stream_fn is given, it receives the review text as it is streamed.
     """
     training_guidelines = train_manager_agent()
     
@@ -54,20 +51,32 @@ def generate_review_paper(summaries, model="gpt-4o", temperature=0.3, max_tokens
         "Review Paper:"
     )
     
+    messages = [
+        {"role": "system", "content": "You are an expert research manager specialized in writing academic review papers."},
+        {"role": "user", "content": prompt},
+    ]
+
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are an expert research manager specialized in writing academic review papers."},
-                {"role": "user", "content": prompt},
-            ],
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
+        if stream_fn is not None:
+            return stream_chat_completion(
+                clients.openai_client(), messages, model, stream_fn, label="review paper", log_fn=log_fn,
+                max_tokens=max_tokens, temperature=temperature,
+            )
+        chat_completion = outbound.call(
+            "openai",
+            lambda: clients.openai_client().chat.completions.create(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            ),
+            log_fn=log_fn,
         )
+        record_usage(chat_completion.usage)
         review_paper = chat_completion.choices[0].message.content.strip()
         return review_paper
     except Exception as e:
-        print(f"Error generating review paper: {e}")
+        log_fn(f"Error generating review paper: {e}")
         return ""
 
 def save_text_to_pdf(text, output_file, log_fn=print):
@@ -78,6 +87,8 @@ def save_text_to_pdf(text, output_file, log_fn=print):
     # Remove Markdown bold markers by replacing **text** with just text.
     clean_text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
     
+    from fpdf import FPDF
+
     # Create an FPDF instance.
     pdf = FPDF()
     pdf.add_page()
@@ -91,7 +102,8 @@ def save_text_to_pdf(text, output_file, log_fn=print):
     pdf.output(output_file)
     log_fn(f"PDF saved to {output_file}")
 
-def main(output_dir, log_fn=print):
+@profiling.profiled("review_writer")
+def main(output_dir, log_fn=print, stream_fn=None):
     summaries_file = os.path.join(output_dir, "summaries.json")
     output_pdf = os.path.join(output_dir, "review_paper.pdf")
 
@@ -104,7 +116,7 @@ def main(output_dir, log_fn=print):
         return
     
     # Generate the review paper.
-    review_paper = generate_review_paper(summaries)
+    review_paper = generate_review_paper(summaries, log_fn=log_fn, stream_fn=stream_fn)
     if not review_paper:
         log_fn("No review paper generated.")
         return
@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+from tools import telemetry
+
+
+def fingerprint(*parts):
+    """Returns a stable SHA-256 fingerprint of JSON-serializable values."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """Returns the SHA-256 fingerprint of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageManifest:
+    """
+    Fingerprints recorded next to a stage's output artifact (<output_file>.fingerprint.json).
+
+    The manifest holds one fingerprint for the stage configuration and one per processed
+    item. If the configuration changed since the last run, all item fingerprints are
+    dropped so every item is processed again. Only items whose output is usable should be
+    recorded, so failed items are always retried.
+    """
+    def __init__(self, output_file, config):
+        self.output_file = output_file
+        self.path = f"{output_file}.fingerprint.json"
+        self.config = fingerprint(config)
+        stored = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                stored = {}
+        self.matches_config = stored.get("config") == self.config
+        self.items = dict(stored.get("items", {})) if self.matches_config else {}
+
+    def is_current(self, key, item_fingerprint):
+        current = self.items.get(key) == item_fingerprint
+        artifact = os.path.basename(self.output_file)
+        telemetry.incr("cache_hits_total" if current else "cache_misses_total", artifact=artifact)
+        return current
+
+    def record(self, key, item_fingerprint):
+        self.items[key] = item_fingerprint
+
+    def forget(self, key):
+        self.items.pop(key, None)
+
+    def retain(self, keys):
+        """Drops the fingerprints of items that are no longer part of the output."""
+        keys = set(keys)
+        self.items = {key: value for key, value in self.items.items() if key in keys}
+
+    def is_complete(self):
+        """True if the output exists and was produced with the current configuration."""
+        complete = self.matches_config and os.path.exists(self.output_file)
+        artifact = os.path.basename(self.output_file)
+        telemetry.incr("cache_hits_total" if complete else "cache_misses_total", artifact=artifact)
+        return complete
+
+    def discard(self):
+        """Removes the manifest, so the stage's current output is not reused by the next run."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, "items": self.items}, f, indent=4)
@@ -1,13 +1,59 @@
 import os
 import json
-from openai import OpenAI
+import time
+from tools.llm_streaming import stream_chat_completion, record_usage
+from tools import outbound, telemetry, profiling, clients
+from stage_cache import StageManifest, fingerprint
 
-OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
+SUMMARY_MODEL = "gpt-4o"
 
-# Initialize the OpenAI client using the new style.
-client = OpenAI(api_key=OPENAI_API_KEY)
+def build_summary_messages(text):
+    """
+    Builds the chat messages used to request a summary of a research paper.
+    Shared by the synchronous and batch summarization paths so both send the same prompt.
+    """
+    prompt = (
+        "Summarize the following research paper content in no more than 500 words:\n\n"
+        f"{text}\n\nSummary:"
+    )
+    return [
+        {"role": "system", "content": "You are a research assistant that summarizes academic papers."},
+        {"role": "user", "content": prompt},
+    ]
+
+def summary_manifest(output_file):
+    """
+    Returns the stage manifest of a summaries file. The model and prompt are part of the
+    stage configuration, and each paper is fingerprinted by its content.
+    """
+    return StageManifest(output_file, {"model": SUMMARY_MODEL, "messages": build_summary_messages("")})
 
-def summarize_text(text, model="gpt-4o", temperature=0.3, log_fn=print):
+def plan_summaries(papers, output_file, paper_keys=None):
+    """
+    Works out which papers need a new summary. Summaries in output_file whose paper
+    content is unchanged are reused. If paper_keys is given, exactly those papers are
+    summarized and the rest of the existing output is kept.
+
+    Returns:
+        tuple: (manifest, reused summaries by key, {paper key: content} to summarize)
+    """
+    existing = _load_json(output_file, {})
+    manifest = summary_manifest(output_file)
+    summaries = {}
+    pending = {}
+    for paper_key, content in papers.items():
+        if paper_keys is not None:
+            if paper_key in paper_keys:
+                pending[paper_key] = content
+            elif paper_key in existing:
+                summaries[paper_key] = existing[paper_key]
+        elif existing.get(paper_key) and manifest.is_current(paper_key, fingerprint(content)):
+            summaries[paper_key] = existing[paper_key]
+        else:
+            pending[paper_key] = content
+    return manifest, summaries, pending
+
+def summarize_text(text, model=SUMMARY_MODEL, temperature=0.3, log_fn=print, stream_fn=None):
     """
     Generates a summary of the provided research paper content in no more than 500 words.
     
@@ -15,23 +61,26 @@ def summarize_text(text, model="gpt-4o", temperature=0.3, log_fn=print):
         text (str): The full research paper content.
         model (str): The OpenAI model to use.
         temperature (float): Sampling temperature.
+        stream_fn (callable): Optional callback receiving the summary text as it is streamed.
         
     Returns:
         str: The generated summary.
     """
-    prompt = (
-        "Summarize the following research paper content in no more than 500 words:\n\n"
-        f"{text}\n\nSummary:"
-    )
-    
+    with telemetry.span("summarize_paper", chars=len(text)):
+        return _summarize_text(text, model=model, log_fn=log_fn, stream_fn=stream_fn)
+
+def _summarize_text(text, model=SUMMARY_MODEL, log_fn=print, stream_fn=None):
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a research assistant that summarizes academic papers."},
-                {"role": "user", "content": prompt},
-            ],
-            model=model,
+        if stream_fn is not None:
+            return stream_chat_completion(
+                clients.openai_client(), build_summary_messages(text), model, stream_fn, label="summary", log_fn=log_fn
+            )
+        chat_completion = outbound.call(
+            "openai",
+            lambda: clients.openai_client().chat.completions.create(messages=build_summary_messages(text), model=model),
+            log_fn=log_fn,
         )
+        record_usage(chat_completion.usage)
         # Access the summary from the response structure.
         summary = chat_completion.choices[0].message.content.strip()
         return summary
@@ -39,33 +88,212 @@ def summarize_text(text, model="gpt-4o", temperature=0.3, log_fn=print):
         log_fn(f"Error generating summary: {e}")
         return ""
 
-def generate_summaries(json_file=None, output_file=None, log_fn=print):
+@profiling.profiled("summarizer")
+def generate_summaries(json_file=None, output_file=None, log_fn=print, batch=False, stream_fn=None, paper_keys=None):
     """
     Reads research content from a JSON file and creates summaries for each paper.
     The resulting summaries are saved in a single JSON file.
+
+    If batch is True, the summaries are produced through the OpenAI Batch API
+    instead of one synchronous request per paper (see generate_summaries_batch).
+    Otherwise stream_fn, if given, receives each summary as it is streamed.
+
+    Papers whose content is unchanged since their summary was written are not
+    summarized again, and paper_keys restricts the run to those papers (see plan_summaries).
     """
     if output_file is None or json_file is None:
         raise ValueError("json_file and output_file must be provided.")
+
+    if batch:
+        return generate_summaries_batch(json_file=json_file, output_file=output_file, log_fn=log_fn)
     
     with open(json_file, "r", encoding="utf-8") as f:
         papers = json.load(f)
     
-    summaries = {}
-    for paper_key, content in papers.items():
+    manifest, summaries, pending = plan_summaries(papers, output_file, paper_keys=paper_keys)
+
+    if summaries:
+        log_fn(f"Reusing {len(summaries)} summaries of unchanged papers from {output_file}")
+
+    for paper_key, content in pending.items():
         log_fn(f"Generating summary for paper: {paper_key}")
+        manifest.forget(paper_key)
         if not content.strip():
             log_fn(f"Content for {paper_key} is empty. Skipping.")
             summaries[paper_key] = ""
             continue
         
-        summary = summarize_text(content)
+        summary = summarize_text(content, log_fn=log_fn, stream_fn=stream_fn)
         summaries[paper_key] = summary
+        if summary:
+            manifest.record(paper_key, fingerprint(content))
         log_fn(f"Summary for {paper_key} generated.")
     
     with open(output_file, "w", encoding="utf-8") as f:
         json.dump(summaries, f, indent=4, ensure_ascii=False)
+    manifest.retain(summaries)
+    manifest.save()
     
     log_fn(f"Summaries saved to {output_file}")
 
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+def _parse_batch_output(text):
+    """
+    Parses the JSONL output file of a finished batch into a {custom_id: summary} dictionary.
+    Requests that failed inside the batch map to an empty summary.
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record.get("custom_id")
+        response = record.get("response") or {}
+        summary = ""
+        if response.get("status_code") == 200:
+            choices = response.get("body", {}).get("choices", [])
+            if choices:
+                summary = (choices[0].get("message", {}).get("content") or "").strip()
+        results[custom_id] = summary
+    return results
+
+def generate_summaries_batch(json_file=None, output_file=None, model=SUMMARY_MODEL, poll_interval=30,
+                             batch_client=None, log_fn=print):
+    """
+    Offline variant of generate_summaries built on the OpenAI Batch API.
+
+    All pending summarization requests are written to a JSONL batch file next to
+    output_file, uploaded and submitted as a single batch. The batch is then polled
+    until it finishes and its results are merged into output_file.
+
+    Progress is tracked in a state file (<output_file>.batch_state.json) holding the
+    batch id and the custom_id -> paper mapping, so an interrupted run resumes polling
+    the already submitted batch instead of submitting a new one. Papers whose summary
+    in output_file is still current (see summary_manifest) are not resubmitted.
+
+    Parameters:
+        batch_client: An OpenAI client to use instead of the shared client. Pointing one at
+            a local stub (OpenAI(base_url=...)) allows testing without the real service.
+    """
+    if output_file is None or json_file is None:
+        raise ValueError("json_file and output_file must be provided.")
+
+    batch_client = batch_client or clients.openai_client()
+    state_file = f"{output_file}.batch_state.json"
+    requests_file = f"{output_file}.batch_requests.jsonl"
+
+    papers = _load_json(json_file, {})
+    existing = _load_json(output_file, {})
+    state = _load_json(state_file, None)
+    manifest = summary_manifest(output_file)
+
+    summaries = {}
+    for paper_key, content in papers.items():
+        if not content.strip():
+            log_fn(f"Content for {paper_key} is empty. Skipping.")
+            summaries[paper_key] = ""
+        elif existing.get(paper_key) and manifest.is_current(paper_key, fingerprint(content)):
+            summaries[paper_key] = existing[paper_key]
+
+    if state is None:
+        pending = {}
+        fingerprints = {}
+        for paper_key, content in papers.items():
+            if paper_key in summaries:
+                continue
+            custom_id = f"paper-{len(pending)}"
+            pending[custom_id] = paper_key
+            fingerprints[custom_id] = fingerprint(content)
+
+        if not pending:
+            _save_json(output_file, summaries)
+            manifest.retain(summaries)
+            manifest.save()
+            log_fn(f"No papers left to summarize. Summaries saved to {output_file}")
+            return
+
+        with open(requests_file, "w", encoding="utf-8") as f:
+            for custom_id, paper_key in pending.items():
+                request = {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {"model": model, "messages": build_summary_messages(papers[paper_key])},
+                }
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+        def upload():
+            with open(requests_file, "rb") as f:
+                return batch_client.files.create(file=f, purpose="batch")
+
+        uploaded = outbound.call("openai", upload, log_fn=log_fn)
+        batch = outbound.call(
+            "openai",
+            lambda: batch_client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            ),
+            log_fn=log_fn,
+        )
+        state = {"batch_id": batch.id, "input_file_id": uploaded.id, "pending": pending, "fingerprints": fingerprints}
+        _save_json(state_file, state)
+        log_fn(f"Submitted batch {batch.id} with {len(pending)} summarization requests.")
+    else:
+        log_fn(f"Resuming batch {state['batch_id']} with {len(state['pending'])} summarization requests.")
+
+    while True:
+        batch = outbound.call("openai", lambda: batch_client.batches.retrieve(state["batch_id"]), log_fn=log_fn)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            break
+        log_fn(f"Batch {batch.id} is {batch.status}. Checking again in {poll_interval} seconds.")
+        time.sleep(poll_interval)
+
+    results = {}
+    if batch.output_file_id:
+        output = outbound.call("openai", lambda: batch_client.files.content(batch.output_file_id), log_fn=log_fn)
+        results = _parse_batch_output(output.text)
+    if batch.status != "completed":
+        log_fn(f"Batch {batch.id} ended with status '{batch.status}'. Missing summaries are left empty.")
+
+    for custom_id, paper_key in state["pending"].items():
+        summaries[paper_key] = results.get(custom_id, "")
+        if summaries[paper_key]:
+            manifest.record(paper_key, state["fingerprints"][custom_id])
+            log_fn(f"Summary for {paper_key} generated.")
+        else:
+            manifest.forget(paper_key)
+
+    _save_json(output_file, summaries)
+    manifest.retain(summaries)
+    manifest.save()
+    os.remove(state_file)
+    if os.path.exists(requests_file):
+        os.remove(requests_file)
+    log_fn(f"Summaries saved to {output_file}")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize the extracted content of a research run.")
+    parser.add_argument("output_dir", help="Run directory containing all_research_content.json.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Use the OpenAI Batch API (cheaper, results within 24 hours; rerun to resume polling).")
+    args = parser.parse_args()
+    generate_summaries(
+        json_file=os.path.join(args.output_dir, "all_research_content.json"),
+        output_file=os.path.join(args.output_dir, "summaries.json"),
+        batch=args.batch,
+    )
+
 if __name__ == "__main__":
-    generate_summaries()
+    main()
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+DEFAULT_LEASE_SECONDS = 900   # A task whose lease runs out is handed to another worker.
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30    # Delay before a failed task is retried, doubled per attempt.
+MAX_RETRY_BACKOFF_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    output_dir TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (output_dir, stage, item_key)
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, stage, available_at);
+"""
+# Columns added after the first release, for databases created before them.
+_ADDED_COLUMNS = {
+    "result": "TEXT",
+}
+
+
+class TaskQueue:
+    """
+    Durable queue of per-paper tasks backed by a SQLite database file.
+
+    A task is one item (a paper, a PDF) of one stage of one run, identified by
+    (output_dir, stage, item_key). Workers lease tasks for a limited time and must
+    complete, fail or extend them before the lease runs out; a task whose lease expired
+    (e.g. because its worker died) is leased again by another worker. Failed tasks are
+    retried with a growing delay until max_attempts is reached; a lost lease counts as a
+    failed attempt.
+
+    A task's payload holds all the data a worker needs and its result is stored with the
+    task, so workers never touch the run's output directory (output_dir only identifies
+    the run). This backend still needs all workers on the host of the database file, as
+    SQLite's WAL mode does not work on network filesystems; a queue service with the same
+    methods can be used instead to spread the work over machines (see task_worker.py).
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, output_dir, stage, item_key, payload, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Adds a task. Enqueuing an item that is already queued or leased leaves it alone;
+        an item that is done or failed is queued again with the new payload.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO tasks (output_dir, stage, item_key, payload, max_attempts, available_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (output_dir, stage, item_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    result = NULL,
+                    status = 'queued',
+                    attempts = 0,
+                    max_attempts = excluded.max_attempts,
+                    available_at = excluded.available_at,
+                    lease_owner = NULL,
+                    lease_expires = NULL,
+                    last_error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE tasks.status IN ('done', 'failed')
+                """,
+                (output_dir, stage, item_key, json.dumps(payload), max_attempts, now, now),
+            )
+
+    def lease(self, worker_id, stages=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Leases the oldest ready task of the given stages (all stages if None) to worker_id.
+        Returns the task as a dictionary with its payload decoded, or None if nothing is ready.
+        """
+        now = time.time()
+        query = (
+            "SELECT * FROM tasks WHERE available_at <= ? AND "
+            "(status = 'queued' OR (status = 'leased' AND lease_expires < ?))"
+        )
+        params = [now, now]
+        if stages:
+            query += f" AND stage IN ({', '.join('?' for _ in stages)})"
+            params.extend(stages)
+        query += " ORDER BY id LIMIT 1"
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # An expired lease on a task that has used up its attempts means its worker died
+            # on every attempt (e.g. killed for running out of memory); give up on the task
+            # instead of handing it out again.
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                "last_error = 'Lease expired on the last attempt; the worker was lost.', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        task = dict(row)
+        task["attempts"] += 1
+        task["payload"] = json.loads(task["payload"])
+        return task
+
+    def extend_lease(self, task_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extends a lease still held by worker_id. Returns False if the lease was lost."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), task_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id, result=None):
+        """
+        Marks a leased task as done and stores its JSON-serializable result.
+        Returns False if the lease was lost to another worker.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (json.dumps(result), time.time(), task_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, worker_id, error):
+        """
+        Records a failed attempt. The task is queued again after a backoff delay, or marked
+        as failed once it has used up its attempts.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM tasks WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (task_id, worker_id),
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+            if row["attempts"] >= row["max_attempts"]:
+                status, available_at = "failed", now
+            else:
+                delay = min(RETRY_BACKOFF_SECONDS * 2 ** (row["attempts"] - 1), MAX_RETRY_BACKOFF_SECONDS)
+                status, available_at = "queued", now + delay
+            conn.execute(
+                "UPDATE tasks SET status = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (status, available_at, str(error), now, task_id),
+            )
+            conn.execute("COMMIT")
+
+    def stage_counts(self, output_dir, stage):
+        """Returns the number of tasks of a run's stage per status."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS count FROM tasks WHERE output_dir = ? AND stage = ? GROUP BY status",
+                (output_dir, stage),
+            ).fetchall()
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update({row["status"]: row["count"] for row in rows})
+        return counts
+
+    def stage_tasks(self, output_dir, stage, status=None):
+        """
+        Returns the tasks of a run's stage, optionally only those with the given status,
+        with their payloads and results decoded.
+        """
+        query = "SELECT * FROM tasks WHERE output_dir = ? AND stage = ?"
+        params = [output_dir, stage]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY id", params).fetchall()
+        tasks = [dict(row) for row in rows]
+        for task in tasks:
+            task["payload"] = json.loads(task["payload"])
+            task["result"] = json.loads(task["result"]) if task["result"] is not None else None
+        return tasks
+
+    def last_activity(self, output_dir, stage):
+        """Time of the most recent change to any task of a run's stage (enqueue, lease, heartbeat, outcome)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(updated_at) AS updated_at FROM tasks WHERE output_dir = ? AND stage = ?",
+                (output_dir, stage),
+            ).fetchone()
+        return row["updated_at"]
+
+    def wait_for_stage(self, output_dir, stage, poll_interval=5.0, timeout=None, idle_timeout=None, log_fn=print):
+        """
+        Blocks until no task of a run's stage is queued or leased, i.e. the stage is drained.
+        Returns the final counts per status. Raises TimeoutError if timeout seconds pass first,
+        or if no task of the stage changed for idle_timeout seconds (no worker is running).
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        last_counts = None
+        while True:
+            counts = self.stage_counts(output_dir, stage)
+            if counts != last_counts:
+                log_fn(f"{stage}: {counts['done']} done, {counts['failed']} failed, "
+                       f"{counts['leased']} in progress, {counts['queued']} queued.")
+                last_counts = counts
+            if counts["queued"] == 0 and counts["leased"] == 0:
+                return counts
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Stage {stage} did not drain within {timeout} seconds.")
+            if idle_timeout is not None:
+                last_activity = self.last_activity(output_dir, stage)
+                if last_activity is not None and time.time() - last_activity > idle_timeout:
+                    raise TimeoutError(
+                        f"No worker has picked up or updated any {stage} task for {idle_timeout} seconds. "
+                        f"Are task workers running for {self.db_path}?"
+                    )
+            time.sleep(poll_interval)
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import base64
+import socket
+import tempfile
+import threading
+from stage_cache import fingerprint
+from task_queue import TaskQueue, DEFAULT_LEASE_SECONDS
+from download_all_papers import download_paper_pdf, pdf_path_for_paper, is_valid_pdf
+from extract_all_data_to_json import extract_content_from_pdf, plan_extraction, save_extraction
+from summary_agent import summarize_text, plan_summaries
+
+STAGES = ("download", "extract", "summarize")
+IDLE_POLL_INTERVAL = 5.0  # Seconds a worker waits when no task is ready.
+# A stage fails if none of its tasks changed for this long. Running tasks are touched by
+# their heartbeat every third of a lease, and retry backoff is shorter than a lease.
+STALL_TIMEOUT = DEFAULT_LEASE_SECONDS
+
+
+def _encode_file(path):
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def _write_file(path, data):
+    """Writes base64 data to path atomically, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(base64.b64decode(data))
+    os.replace(tmp_path, path)
+
+
+# Handlers get a task's payload and return its result. Payloads carry all the data a task
+# needs (PDFs are sent base64-encoded) and results come back through the queue, so a
+# worker only needs access to the queue, not to the run's output directory.
+
+def _download(payload, log_fn):
+    with tempfile.TemporaryDirectory(prefix="task_download_") as folder:
+        pdf_path = download_paper_pdf(payload, folder, log_fn=log_fn)
+        if not pdf_path:
+            # download_paper_pdf reports errors by returning None; fail so the task is retried.
+            raise RuntimeError("No PDF could be downloaded.")
+        return {"filename": os.path.basename(pdf_path), "pdf": _encode_file(pdf_path)}
+
+
+def _extract(payload, log_fn):
+    with tempfile.TemporaryDirectory(prefix="task_extract_") as folder:
+        pdf_path = os.path.join(folder, os.path.basename(payload["filename"]))
+        _write_file(pdf_path, payload["pdf"])
+        return {"content": extract_content_from_pdf(pdf_path)}
+
+
+def _summarize(payload, log_fn):
+    summary = summarize_text(payload["content"], log_fn=log_fn)
+    if not summary:
+        # summarize_text reports errors by returning an empty summary; fail so the task is retried.
+        raise RuntimeError("Empty summary returned.")
+    return {"summary": summary}
+
+
+STAGE_HANDLERS = {
+    "download": _download,
+    "extract": _extract,
+    "summarize": _summarize,
+}
+
+
+def enqueue_stage(task_queue, output_dir, stage, items=None, log_fn=print):
+    """
+    Queues the per-paper tasks of a stage for the run in output_dir and returns the
+    fingerprints of the queued items' inputs by item key. Only new or changed items are
+    queued for extraction and summarization (see plan_extraction and plan_summaries), and
+    papers whose PDF was already downloaded are not downloaded again; items restricts the
+    stage to the given paper titles, PDF filenames or paper keys.
+    """
+    output_dir = os.path.abspath(output_dir)
+    if stage == "download":
+        with open(os.path.join(output_dir, "deep_reference_results.json"), "r", encoding="utf-8") as f:
+            papers = json.load(f)
+        papers_folder = os.path.join(output_dir, "research_papers")
+        tasks = {
+            paper.get("title", "paper"): dict(paper, fingerprint=fingerprint(paper))
+            for paper in papers
+            if (paper.get("title", "paper") in items if items is not None
+                else not is_valid_pdf(pdf_path_for_paper(paper, papers_folder)))
+        }
+    elif stage == "extract":
+        input_folder = os.path.join(output_dir, "research_papers")
+        _, _, pending = plan_extraction(input_folder, os.path.join(output_dir, "all_research_content.json"), filenames=items)
+        tasks = {
+            filename: {
+                "filename": filename,
+                "pdf": _encode_file(os.path.join(input_folder, filename)),
+                "fingerprint": pdf_fingerprint,
+            }
+            for filename, pdf_fingerprint in pending.items()
+        }
+    elif stage == "summarize":
+        with open(os.path.join(output_dir, "all_research_content.json"), "r", encoding="utf-8") as f:
+            papers = json.load(f)
+        _, _, pending = plan_summaries(papers, os.path.join(output_dir, "summaries.json"), paper_keys=items)
+        tasks = {
+            key: {"content": content, "fingerprint": fingerprint(content)}
+            for key, content in pending.items() if content.strip()
+        }
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    for item_key, payload in tasks.items():
+        task_queue.enqueue(output_dir, stage, item_key, payload)
+    log_fn(f"Queued {len(tasks)} {stage} tasks.")
+    return {item_key: payload["fingerprint"] for item_key, payload in tasks.items()}
+
+
+def _queued_results(task_queue, output_dir, stage, queued):
+    """
+    Results of the done tasks among the queued items, by item key. A task only counts if it
+    ran on the input that was queued: tasks of earlier runs of the stage, or ones that were
+    still running on an older payload when the stage was queued, are left out.
+    """
+    results = {}
+    for task in task_queue.stage_tasks(output_dir, stage, status="done"):
+        item_key = task["item_key"]
+        if item_key in queued and task["payload"].get("fingerprint") == queued[item_key] and task["result"]:
+            results[item_key] = task["result"]
+    return results
+
+
+def collect_stage(task_queue, output_dir, stage, queued, items=None, log_fn=print):
+    """
+    Merges the results of a drained stage into the run's output, the same way the in-process
+    agents write it: downloaded PDFs go to research_papers, extracted content and summaries
+    to their output files. queued and items are the fingerprints returned by, and the items
+    passed to, enqueue_stage.
+    """
+    output_dir = os.path.abspath(output_dir)
+    results = _queued_results(task_queue, output_dir, stage, queued)
+    if stage == "download":
+        for result in results.values():
+            _write_file(os.path.join(output_dir, "research_papers", os.path.basename(result["filename"])), result["pdf"])
+        log_fn(f"Saved {len(results)} downloaded PDFs.")
+    elif stage == "extract":
+        output_file = os.path.join(output_dir, "all_research_content.json")
+        manifest, data, pending = plan_extraction(os.path.join(output_dir, "research_papers"), output_file, filenames=items)
+        extracted = {
+            os.path.splitext(filename)[0]: results[filename]["content"]
+            for filename, pdf_fingerprint in pending.items()
+            if filename in results and queued[filename] == pdf_fingerprint
+        }
+        save_extraction(output_file, manifest, data, pending, extracted, log_fn=log_fn)
+    elif stage == "summarize":
+        output_file = os.path.join(output_dir, "summaries.json")
+        with open(os.path.join(output_dir, "all_research_content.json"), "r", encoding="utf-8") as f:
+            papers = json.load(f)
+        manifest, summaries, pending = plan_summaries(papers, output_file, paper_keys=items)
+        for key, content in pending.items():
+            content_fingerprint = fingerprint(content)
+            if key in results and queued[key] == content_fingerprint:
+                summaries[key] = results[key]["summary"]
+                manifest.record(key, content_fingerprint)
+            else:
+                summaries[key] = ""
+                manifest.forget(key)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=4, ensure_ascii=False)
+        manifest.retain(summaries)
+        manifest.save()
+        log_fn(f"Summaries saved to {output_file}")
+
+
+def run_stage_on_queue(task_queue, output_dir, stage, items=None, log_fn=print, poll_interval=5.0,
+                       idle_timeout=STALL_TIMEOUT):
+    """
+    Queues a stage's tasks, waits until workers have drained them and merges the results.
+    Raises TimeoutError if no worker works on the stage for idle_timeout seconds.
+    """
+    queued = enqueue_stage(task_queue, output_dir, stage, items=items, log_fn=log_fn)
+    counts = task_queue.wait_for_stage(
+        os.path.abspath(output_dir), stage, poll_interval=poll_interval, idle_timeout=idle_timeout, log_fn=log_fn
+    )
+    for task in task_queue.stage_tasks(os.path.abspath(output_dir), stage, status="failed"):
+        if task["item_key"] in queued:
+            log_fn(f"{stage} task for '{task['item_key']}' failed: {task['last_error']}")
+    collect_stage(task_queue, output_dir, stage, queued, items=items, log_fn=log_fn)
+    return counts
+
+
+def process_task(task_queue, task, worker_id, log_fn=print, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Runs one leased task, keeping its lease alive while it runs, and records the outcome."""
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(lease_seconds / 3):
+            if not task_queue.extend_lease(task["id"], worker_id, lease_seconds):
+                return
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    try:
+        handler = STAGE_HANDLERS[task["stage"]]
+        result = handler(task["payload"], log_fn)
+    except Exception as e:
+        log_fn(f"{task['stage']} task for '{task['item_key']}' failed (attempt {task['attempts']}): {e}")
+        task_queue.fail(task["id"], worker_id, e)
+        return False
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+    if not task_queue.complete(task["id"], worker_id, result):
+        log_fn(f"Lease on {task['stage']} task for '{task['item_key']}' was lost; another worker owns it now.")
+    return True
+
+
+def worker_main(task_queue, stages=None, worker_id=None, log_fn=print, stop_event=None):
+    """
+    Pulls tasks of the given stages (all stages if None) from task_queue and runs them until
+    stopped. task_queue is a TaskQueue or another queue backend with the same methods.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    log_fn(f"Task worker {worker_id} started for stages: {', '.join(stages or STAGES)}.")
+    while stop_event is None or not stop_event.is_set():
+        task = task_queue.lease(worker_id, stages=stages)
+        if task is None:
+            time.sleep(IDLE_POLL_INTERVAL)
+            continue
+        process_task(task_queue, task, worker_id, log_fn=log_fn)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run per-paper download, extraction and summarization tasks from a shared queue.")
+    parser.add_argument("--db", required=True, help="Path to the shared task queue database.")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="Stage to work on (repeatable). Defaults to all stages.")
+    parser.add_argument("--worker-id", default=None, help="Identifier of this worker in leases.")
+    args = parser.parse_args()
+    try:
+        worker_main(TaskQueue(args.db), stages=args.stage, worker_id=args.worker_id)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
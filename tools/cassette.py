@@ -0,0 +1,364 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import functools
+import threading
+from collections import Counter
+
+# Record/replay of external calls. With a cassette in "record" mode, every HTTP request
+# sent through tools/outbound.py, every OpenAI API request and every call of a function
+# decorated with replayable() is stored with its response; in "replay" mode the stored
+# responses are served back instead, so a run can be re-executed exactly and without
+# network access. Setting DEEP_RESEARCH_CASSETTE (and DEEP_RESEARCH_CASSETTE_MODE,
+# DEEP_RESEARCH_REPLAY_LATENCY) configures every process of a run; use() does the same
+# for the current process and must be called before the first OpenAI request.
+CASSETTE_ENV = "DEEP_RESEARCH_CASSETTE"
+CASSETTE_MODE_ENV = "DEEP_RESEARCH_CASSETTE_MODE"
+REPLAY_LATENCY_ENV = "DEEP_RESEARCH_REPLAY_LATENCY"
+MODES = ("record", "replay")
+LATENCIES = ("original", "zero")
+
+# Response headers that describe the transfer rather than the content.
+_TRANSFER_HEADERS = {"content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request that the cassette holds no recording of."""
+
+
+class Cassette:
+    """
+    A SQLite file of recorded interactions, indexed by a hash of the request. Identical
+    requests are numbered in the order they were made and replayed in the same order;
+    once the recordings of a request are used up, the last one is served again.
+    Response bodies are stored zlib-compressed, with the timing of their chunks so that
+    streamed responses can be replayed at their original pace.
+    """
+    def __init__(self, path, mode="replay", latency="original"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in LATENCIES:
+            raise ValueError(f"Unknown replay latency: {latency}")
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"Cassette {path} does not exist.")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._served = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS interactions (
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                request TEXT NOT NULL,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                chunks TEXT,
+                duration REAL NOT NULL,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (key, seq)
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def record(self, key, kind, request, status, headers, body, chunks, duration):
+        """Stores one interaction after the earlier recordings of the same request."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq) + 1, 0) FROM interactions WHERE key = ?", (key,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO interactions (key, seq, kind, request, status, headers, body, chunks, duration, recorded_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, seq, kind, request, status, json.dumps(headers), zlib.compress(body),
+                     json.dumps(chunks) if chunks is not None else None, duration, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def lookup(self, key, request):
+        """Returns the next recorded response to a request, or raises CassetteMissError."""
+        with self._lock:
+            seq = self._served[key]
+            self._served[key] += 1
+            row = self._conn.execute(
+                "SELECT status, headers, body, chunks, duration FROM interactions"
+                " WHERE key = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+                (key, seq),
+            ).fetchone()
+        if row is None:
+            raise CassetteMissError(f"No recording of {request} in cassette {self.path}.")
+        status, headers, body, chunks, duration = row
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "body": zlib.decompress(body),
+            "chunks": json.loads(chunks) if chunks else None,
+            "duration": duration,
+        }
+
+    def wait(self, seconds):
+        """Sleeps for a recorded delay, unless replaying with zero latency."""
+        if self.mode == "replay" and self.latency == "original" and seconds > 0:
+            time.sleep(seconds)
+
+
+_active = None
+_configured = False
+_active_lock = threading.Lock()
+
+
+def use(path, mode="replay", latency="original"):
+    """Records into, or replays from, the cassette at path for the rest of the process."""
+    global _active, _configured
+    with _active_lock:
+        if _active is not None:
+            _active.close()
+        _active = Cassette(path, mode, latency)
+        _configured = True
+        return _active
+
+
+def stop():
+    """Stops recording or replaying; calls go to the network again."""
+    global _active, _configured
+    with _active_lock:
+        if _active is not None:
+            _active.close()
+        _active = None
+        _configured = True
+
+
+def active():
+    """The cassette of the process, opened from the environment on first use, or None."""
+    global _active, _configured
+    with _active_lock:
+        if not _configured:
+            _configured = True
+            path = os.environ.get(CASSETTE_ENV)
+            if path:
+                _active = Cassette(
+                    path,
+                    os.environ.get(CASSETTE_MODE_ENV, "replay"),
+                    os.environ.get(REPLAY_LATENCY_ENV, "original"),
+                )
+        return _active
+
+
+def is_replaying():
+    cassette = active()
+    return cassette is not None and cassette.mode == "replay"
+
+
+def request_key(kind, method, url, body=b""):
+    digest = hashlib.sha256(f"{kind} {method.upper()} {url}\n".encode("utf-8"))
+    digest.update(body if isinstance(body, bytes) else str(body).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _requests_body(kwargs):
+    parts = []
+    for name in ("params", "json"):
+        if kwargs.get(name) is not None:
+            parts.append(json.dumps(kwargs[name], sort_keys=True, default=str).encode("utf-8"))
+    data = kwargs.get("data")
+    if data is not None:
+        if isinstance(data, bytes):
+            parts.append(data)
+        elif isinstance(data, str):
+            parts.append(data.encode("utf-8"))
+        else:
+            parts.append(json.dumps(data, sort_keys=True, default=str).encode("utf-8"))
+    return b"\n".join(parts)
+
+
+def _replayed_response(entry, url):
+    import requests
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+    response.url = url
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = entry["body"]
+    response._content_consumed = True
+    return response
+
+
+def send(method, url, **kwargs):
+    """requests.request(method, url, **kwargs), recorded into or replayed from the active cassette."""
+    import requests
+    cassette = active()
+    if cassette is None:
+        return requests.request(method, url, **kwargs)
+
+    key = request_key("http", method, url, _requests_body(kwargs))
+    if cassette.mode == "replay":
+        entry = cassette.lookup(key, f"{method} {url}")
+        cassette.wait(entry["duration"])
+        return _replayed_response(entry, url)
+
+    started = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+    body = response.content  # Also reads streamed bodies; iter_content() then serves them from memory.
+    # requests has already decoded the body, so the content encoding no longer applies to it.
+    headers = {
+        name: value for name, value in response.headers.items()
+        if name.lower() not in _TRANSFER_HEADERS and name.lower() != "content-encoding"
+    }
+    cassette.record(key, "http", f"{method} {url}", response.status_code, headers, body, None,
+                    time.perf_counter() - started)
+    return response
+
+
+def replayable(name):
+    """
+    Decorator for calls that are not plain HTTP requests (e.g. Selenium page scraping).
+    The JSON-serializable return value is recorded per call arguments (callables such as
+    log_fn are ignored); in replay mode it is returned without calling the function.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cassette = active()
+            if cassette is None:
+                return fn(*args, **kwargs)
+            arguments = json.dumps(
+                [[a for a in args if not callable(a)], {k: v for k, v in sorted(kwargs.items()) if not callable(v)}],
+                default=str,
+            )
+            key = request_key("call", name, arguments)
+            if cassette.mode == "replay":
+                entry = cassette.lookup(key, f"{name}({arguments})")
+                cassette.wait(entry["duration"])
+                return json.loads(entry["body"])
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            cassette.record(key, "call", f"{name}({arguments})", None, {}, json.dumps(result).encode("utf-8"),
+                            None, time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorator
+
+
+_BOUNDARY_PATTERN = re.compile(r'boundary="?([^";]+)"?')
+_FILENAME_PATTERN = re.compile(rb'filename="([^"]*)"')
+
+
+def _normalize_body(content_type, body):
+    """Makes multipart uploads comparable across runs: fixed boundary, file names without folders."""
+    match = _BOUNDARY_PATTERN.search(content_type or "")
+    if not match:
+        return body
+    body = body.replace(match.group(1).encode("latin-1"), b"BOUNDARY")
+    return _FILENAME_PATTERN.sub(lambda m: b'filename="' + os.path.basename(m.group(1)) + b'"', body)
+
+
+_transport_class = None
+
+
+def _cassette_transport_class():
+    """Builds the httpx transport class on first use, so httpx is only imported by OpenAI users."""
+    global _transport_class
+    if _transport_class is not None:
+        return _transport_class
+    import httpx
+
+    class RecordingStream(httpx.SyncByteStream):
+        def __init__(self, stream, on_complete):
+            self._stream = stream
+            self._on_complete = on_complete
+            self._chunks = []
+            self._body = bytearray()
+
+        def __iter__(self):
+            last = time.perf_counter()
+            for chunk in self._stream:
+                now = time.perf_counter()
+                self._chunks.append([round(now - last, 4), len(chunk)])
+                self._body += chunk
+                last = now
+                yield chunk
+            self._on_complete(bytes(self._body), self._chunks)
+
+        def close(self):
+            self._stream.close()
+
+    class ReplayStream(httpx.SyncByteStream):
+        def __init__(self, cassette, entry):
+            self._cassette = cassette
+            self._entry = entry
+
+        def __iter__(self):
+            body = self._entry["body"]
+            offset = 0
+            for delay, length in self._entry["chunks"] or [[0, len(body)]]:
+                self._cassette.wait(delay)
+                yield body[offset:offset + length]
+                offset += length
+
+    class CassetteTransport(httpx.BaseTransport):
+        """httpx transport that records into, or replays from, the active cassette."""
+        def __init__(self):
+            self._inner = httpx.HTTPTransport()
+
+        def handle_request(self, request):
+            cassette = active()
+            if cassette is None:
+                return self._inner.handle_request(request)
+            body = _normalize_body(request.headers.get("content-type"), request.read())
+            key = request_key("openai", request.method, str(request.url), body)
+            description = f"{request.method} {request.url}"
+            if cassette.mode == "replay":
+                entry = cassette.lookup(key, description)
+                cassette.wait(entry["duration"])
+                return httpx.Response(entry["status"], headers=entry["headers"], stream=ReplayStream(cassette, entry))
+
+            started = time.perf_counter()
+            response = self._inner.handle_request(request)
+            duration = time.perf_counter() - started
+            headers = {
+                name: value for name, value in response.headers.items() if name.lower() not in _TRANSFER_HEADERS
+            }
+
+            def save(content, chunks):
+                cassette.record(key, "openai", description, response.status_code, headers, content, chunks, duration)
+
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=RecordingStream(response.stream, save),
+                extensions=response.extensions,
+            )
+
+        def close(self):
+            self._inner.close()
+
+    _transport_class = CassetteTransport
+    return _transport_class
+
+
+def openai_http_client():
+    """
+    HTTP client for OpenAI SDK clients (OpenAI(http_client=...)) that records and replays
+    through the active cassette, or None to keep the SDK's default client.
+    """
+    if active() is None:
+        return None
+    from openai import DefaultHttpxClient
+    return DefaultHttpxClient(transport=_cassette_transport_class()())
@@ -0,0 +1,42 @@
+import os
+import threading
+from tools import outbound, cassette
+
+# API clients are created on first use and shared by all threads of the process, so
+# importing a module needs neither the SDK nor an API key, and a missing key only fails
+# the step that actually calls the service.
+_lock = threading.Lock()
+_openai_client = None
+
+
+def api_key(name):
+    """Reads an API key from the environment, failing with a clear message if it is not set."""
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"{name} is not set in the environment.")
+    return value
+
+
+def openai_client():
+    """
+    The process-wide OpenAI client. Retries and timeouts are handled by the shared outbound
+    layer instead of the SDK, and requests go through the active cassette, if any.
+    """
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            from openai import OpenAI
+            _openai_client = OpenAI(
+                api_key=api_key("OPENAI_API_KEY"),
+                max_retries=0,
+                timeout=outbound.OPENAI_TIMEOUT,
+                http_client=cassette.openai_http_client(),
+            )
+        return _openai_client
+
+
+def reset():
+    """Drops the shared clients, e.g. after changing keys or cassettes; they are recreated on next use."""
+    global _openai_client
+    with _lock:
+        _openai_client = None
@@ -2,7 +2,15 @@ import os
 import sys
 import re
 from collections import defaultdict
-from unstructured.partition.pdf import partition_pdf  # Actual import
+
+# Options passed to partition_pdf. They are part of the extraction stage fingerprint,
+# so changing them invalidates previously extracted content.
+PARTITION_OPTIONS = {
+    "include_page_breaks": True,
+    "strategy": "auto",
+    "infer_table_structure": False,
+    "extract_images_in_pdf": False,
+}
 
 def clean_text(text):
     """Clean text by stripping extra whitespace."""
@@ -10,13 +18,9 @@ def clean_text(text):
 
 def process_pdf_with_unstructured(pdf_path):
     """Processes the PDF using the unstructured library and organizes data."""
-    elements = partition_pdf(
-        filename=pdf_path,
-        include_page_breaks=True,
-        strategy="auto",
-        infer_table_structure=False,
-        extract_images_in_pdf=False,
-    )
+    # Imported here, as unstructured takes seconds to load and most callers never parse a PDF.
+    from unstructured.partition.pdf import partition_pdf
+    elements = partition_pdf(filename=pdf_path, **PARTITION_OPTIONS)
     content_by_page = defaultdict(lambda: {"text": [], "images": [], "tables": []})
 
     for element in elements:
@@ -0,0 +1,53 @@
+import time
+from tools import outbound, telemetry
+
+def record_usage(usage):
+    """Adds the token usage of an OpenAI completion to the token counters."""
+    if usage is None:
+        return
+    telemetry.incr("openai_tokens_total", usage.prompt_tokens or 0, direction="in")
+    telemetry.incr("openai_tokens_total", usage.completion_tokens or 0, direction="out")
+
+def stream_chat_completion(client, messages, model, stream_fn, label="completion", log_fn=print, **kwargs):
+    """
+    Runs a streamed chat completion, forwarding each text delta to stream_fn as it arrives.
+    The time to first token and the total time are reported through log_fn once the
+    stream is finished.
+
+    Returns:
+        str: The full completion text.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+
+    # Only opening the stream is retried, so no token is ever sent to stream_fn twice.
+    stream = outbound.call(
+        "openai",
+        lambda: client.chat.completions.create(
+            messages=messages, model=model, stream=True, stream_options={"include_usage": True}, **kwargs
+        ),
+        log_fn=log_fn,
+    )
+    for chunk in stream:
+        # With include_usage, the last chunk carries the token usage and no choices.
+        if getattr(chunk, "usage", None) is not None:
+            record_usage(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        parts.append(delta)
+        stream_fn(delta)
+
+    total = time.perf_counter() - start
+    if first_token_at is not None:
+        telemetry.incr("openai_time_to_first_token_seconds_total", first_token_at - start)
+    if first_token_at is None:
+        log_fn(f"Streamed {label}: no tokens received after {total:.2f}s.")
+    else:
+        log_fn(f"Streamed {label} in {total:.2f}s (time to first token {first_token_at - start:.2f}s).")
+    return "".join(parts).strip()
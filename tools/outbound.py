@@ -0,0 +1,249 @@
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from tools import telemetry, cassette
+
+# Requests per second and burst size of each service's token bucket. Hosts without an
+# entry of their own share the "default" limits, with one bucket per host.
+RATE_LIMITS = {
+    "serper": {"rate": 5.0, "burst": 5},
+    "openai": {"rate": 2.0, "burst": 5},
+    "scihub": {"rate": 0.5, "burst": 1},
+    "default": {"rate": 2.0, "burst": 4},
+}
+DEFAULT_TIMEOUT = (10, 60)       # (connect, read) seconds for HTTP requests.
+MAX_RETRIES = 4                  # Retries after the first attempt on 429, 5xx and connection errors.
+BACKOFF_BASE = 1.0               # Seconds; doubled per retry, with full jitter.
+BACKOFF_MAX = 60.0
+BREAKER_FAILURE_THRESHOLD = 5    # Consecutive failures that open a host's circuit.
+BREAKER_RESET_TIMEOUT = 60.0     # Seconds an open circuit rejects calls before allowing a trial call.
+
+# Exception classes (matched by name, so their libraries need not be imported here) that are
+# worth retrying: OpenAI SDK connection/throttling/server errors and Selenium page-load timeouts.
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError", "TimeoutException"}
+OPENAI_TIMEOUT = 120.0           # Seconds per OpenAI request; the SDK's own retries are disabled in favor of call().
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the target's circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After BREAKER_FAILURE_THRESHOLD consecutive failures the
+    circuit opens and calls fail fast; after BREAKER_RESET_TIMEOUT one trial call is let
+    through, and its outcome closes or reopens the circuit.
+    """
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    def before_call(self, name):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_progress:
+                raise CircuitOpenError(f"Circuit for {name} is open after repeated failures.")
+            self.trial_in_progress = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_buckets = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def _bucket_for(service, host):
+    key = service if service in RATE_LIMITS else f"host:{host}"
+    with _registry_lock:
+        if key not in _buckets:
+            limits = RATE_LIMITS.get(service, RATE_LIMITS["default"])
+            _buckets[key] = TokenBucket(limits["rate"], limits["burst"])
+        return _buckets[key]
+
+
+def _breaker_for(host):
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def _status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable_status(status):
+    return status == 429 or (status is not None and status >= 500)
+
+
+def is_retryable_error(error):
+    """True for throttling, server errors, timeouts and connection errors of requests or the OpenAI SDK."""
+    import requests
+    status = _status_of(error)
+    if status is not None:
+        return is_retryable_status(status)
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Delay before retry number attempt (starting at 1): full-jitter exponential backoff, or Retry-After if given."""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def call(service, fn, host=None, retries=MAX_RETRIES, log_fn=None):
+    """
+    Runs fn() as an outbound call to service: waits for the service's rate limit, checks
+    the host's circuit breaker and retries retryable errors with jittered exponential backoff
+    (or the Retry-After of the error's response). Non-retryable errors and the last
+    retryable one are raised to the caller.
+    """
+    host = host or service
+    # A replayed run takes the same attempts as the recorded one (every attempt is in the
+    # cassette, including throttled ones), but without rate-limit waits or backoff sleeps.
+    replaying = cassette.is_replaying()
+    bucket = _bucket_for(service, host)
+    breaker = _breaker_for(host)
+    attempt = 0
+    while True:
+        breaker.before_call(host)
+        if not replaying:
+            bucket.acquire()
+        telemetry.incr("outbound_calls_total", service=service)
+        try:
+            with telemetry.span("outbound_call", service=service, replayed=replaying):
+                result = fn()
+        except Exception as e:
+            telemetry.incr("outbound_errors_total", service=service)
+            if not is_retryable_error(e):
+                status = _status_of(e)
+                if status is not None and status < 500:
+                    # The service answered (e.g. with a 4xx), so the host itself is healthy.
+                    breaker.record_success()
+                else:
+                    # No answer at all, e.g. a TLS or protocol error: count it against the host.
+                    breaker.record_failure()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = backoff_delay(attempt, _retry_after(getattr(e, "response", None)))
+            if log_fn:
+                log_fn(f"Call to {service} failed ({e}). Retrying in {delay:.1f}s.")
+            if not replaying:
+                time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def request(method, url, service=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, log_fn=None, **kwargs):
+    """
+    Sends an HTTP request through the shared rate limits and circuit breakers, with a timeout.
+    Responses with status 429 or 5xx are retried (honoring Retry-After); if every attempt
+    fails that way, the last response is returned so callers can check its status as before.
+    With an active cassette, requests are recorded or replayed (see tools/cassette.py).
+    """
+    # requests is imported on first use, so modules that only use call() load faster.
+    import requests
+    host = urlparse(url).netloc
+    service = service or host
+    replaying = cassette.is_replaying()
+    bucket = _bucket_for(service, host)
+    breaker = _breaker_for(host)
+    attempt = 0
+    while True:
+        breaker.before_call(host)
+        if not replaying:
+            bucket.acquire()
+        try:
+            with telemetry.span("outbound_call", service=service, method=method, replayed=replaying) as attributes:
+                response = cassette.send(method, url, timeout=timeout, **kwargs)
+                attributes["status"] = response.status_code
+        except (requests.ConnectionError, requests.Timeout) as e:
+            telemetry.incr("outbound_calls_total", service=service, status="error")
+            breaker.record_failure()
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = backoff_delay(attempt)
+            if log_fn:
+                log_fn(f"Request to {host} failed ({e}). Retrying in {delay:.1f}s.")
+            if not replaying:
+                time.sleep(delay)
+            continue
+        except Exception:
+            # E.g. too many redirects, an invalid URL or a broken chunked response. Recording
+            # the failure also ends a trial call, which would otherwise keep the circuit open.
+            telemetry.incr("outbound_calls_total", service=service, status="error")
+            breaker.record_failure()
+            raise
+
+        telemetry.incr("outbound_calls_total", service=service, status=response.status_code)
+        if not is_retryable_status(response.status_code):
+            breaker.record_success()
+            return response
+        breaker.record_failure()
+        attempt += 1
+        if attempt > retries:
+            return response
+        delay = backoff_delay(attempt, _retry_after(response))
+        if log_fn:
+            log_fn(f"Request to {host} returned {response.status_code}. Retrying in {delay:.1f}s.")
+        response.close()
+        if not replaying:
+            time.sleep(delay)
@@ -1,21 +1,30 @@
 import os
 import json
-import requests
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import os
+from urllib.parse import urlparse
+from tools import outbound, telemetry, cassette
+
+# Overridable so the benchmarks can point Sci-Hub lookups at a local stand-in.
+SCIHUB_BASE_URL = os.environ.get("SCIHUB_BASE_URL", "https://sci-hub.se")
 
 def download_pdf(pdf_url, save_path, log_fn=print):
-    """Downloads a PDF from a given URL without CAPTCHA handling."""
+    """
+    Downloads a PDF from a given URL without CAPTCHA handling.
+    The file is written under a temporary name and moved into place once complete,
+    so an interrupted download never leaves a truncated PDF at save_path.
+    """
     headers = {"User-Agent": "Mozilla/5.0"}
     try:
-        response = requests.get(pdf_url, headers=headers, stream=True)
+        response = outbound.request("GET", pdf_url, headers=headers, stream=True, log_fn=log_fn)
         if response.status_code == 200:
-            with open(save_path, "wb") as file:
+            part_path = f"{save_path}.part"
+            size = 0
+            with open(part_path, "wb") as file:
                 for chunk in response.iter_content(1024):
                     file.write(chunk)
+                    size += len(chunk)
+            os.replace(part_path, save_path)
+            telemetry.incr("downloaded_bytes_total", size)
             log_fn(f"PDF saved to {save_path}")
         else:
             log_fn(f"Failed to download PDF ({response.status_code}): {pdf_url}")
@@ -24,15 +33,16 @@ def download_pdf(pdf_url, save_path, log_fn=print):
 
 def get_scihub_pdf(doi, log_fn=print):
     """Fetch PDF URL from Sci-Hub using a given DOI."""
-    scihub_url = f"https://sci-hub.se/{doi}"
+    scihub_url = f"{SCIHUB_BASE_URL}/{doi}"
     headers = {"User-Agent": "Mozilla/5.0"}
 
     try:
-        response = requests.get(scihub_url, headers=headers)
+        response = outbound.request("GET", scihub_url, service="scihub", headers=headers, log_fn=log_fn)
         if response.status_code != 200:
             log_fn(f"Failed to fetch Sci-Hub page: {response.status_code}")
             return None
 
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
         iframe = soup.find("iframe")
 
@@ -47,15 +57,30 @@ def get_scihub_pdf(doi, log_fn=print):
 
     return None
 
+PAGE_LOAD_TIMEOUT = 60  # Seconds Selenium waits for an article page to load.
+
+# Page scraping is not plain HTTP, so its result (the PDF link) is what gets recorded.
+@cassette.replayable("get_pdf_from_html")
 def get_pdf_from_html(html_url, log_fn=print):
     """Uses Selenium to extract the PDF download link from an article page."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.headless = True
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
 
+    host = urlparse(html_url).netloc
     driver = webdriver.Chrome(options=options)
-    driver.get(html_url)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    try:
+        # Page loads share the host's rate limit and circuit breaker with plain HTTP requests.
+        outbound.call(host, lambda: driver.get(html_url), host=host, retries=1, log_fn=log_fn)
+    except Exception as e:
+        log_fn(f"Failed to load page: {html_url} | Error: {e}")
+        driver.quit()
+        return None
     time.sleep(3)
 
     pdf_url = None
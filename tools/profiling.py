@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Setting DEEP_RESEARCH_PROFILE_DIR profiles every stage entry point (the modules' main
+# functions) of the process into that folder; ManagerAgent(profile=True) does the same
+# for one run via enable().
+PROFILE_DIR_ENV = "DEEP_RESEARCH_PROFILE_DIR"
+PROFILE_INTERVAL_ENV = "DEEP_RESEARCH_PROFILE_INTERVAL"
+DEFAULT_INTERVAL = 0.01  # Seconds between samples; about 100 stack samples per second.
+
+_profile_dir = None
+_active = None
+_active_lock = threading.Lock()
+
+
+def enable(profile_dir):
+    """Profiles every stage entry point called from now on into profile_dir."""
+    global _profile_dir
+    _profile_dir = profile_dir
+
+
+def disable():
+    global _profile_dir
+    _profile_dir = None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(f"thread:{thread_name}")
+    return ";".join(reversed(labels))
+
+
+def _thread_cpu_time(ident):
+    """CPU time consumed so far by a thread, or None where per-thread CPU clocks are unavailable."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the Python stacks of all threads of the process
+    from a background thread. Every sample counts towards the wall-clock profile; a
+    sample also counts towards the CPU profile if its thread used CPU since the previous
+    sample (measured with per-thread CPU clocks), which separates computing from waiting
+    on the network or locks. Work done in child processes is not sampled.
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.wall_samples = Counter()
+        self.cpu_samples = Counter()
+        self.cpu_clocks_available = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        last_cpu = {}
+        last_sample_at = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed = now - last_sample_at
+            last_sample_at = now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _collapse(frame, names.get(ident, ident))
+                self.wall_samples[stack] += 1
+                cpu = _thread_cpu_time(ident)
+                if cpu is None:
+                    self.cpu_clocks_available = False
+                    continue
+                previous = last_cpu.get(ident)
+                last_cpu[ident] = cpu
+                # Count the sample as on-CPU if the thread ran for at least a fifth of the interval.
+                if previous is not None and cpu - previous >= 0.2 * elapsed:
+                    self.cpu_samples[stack] += 1
+
+
+def _write_folded(path, samples):
+    # One "frame;frame;frame count" line per stack: the input format of flamegraph.pl and speedscope.
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def _top_functions(samples, limit=20):
+    """Leaf functions with the most samples, i.e. where the time was spent directly."""
+    leaves = Counter()
+    for stack, count in samples.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return [{"function": name, "samples": count} for name, count in leaves.most_common(limit)]
+
+
+def _unique_prefix(profile_dir, stage):
+    prefix = os.path.join(profile_dir, stage)
+    attempt = 1
+    while os.path.exists(f"{prefix}.summary.json"):
+        attempt += 1
+        prefix = os.path.join(profile_dir, f"{stage}.{attempt}")
+    return prefix
+
+
+@contextmanager
+def profile(stage, profile_dir, interval=None):
+    """
+    Profiles the enclosed block and writes, next to the run's outputs in profile_dir:
+    <stage>.wall.folded and <stage>.cpu.folded (collapsed stacks for flamegraphs) and
+    <stage>.summary.json (wall vs. CPU time, including CPU used by child processes, and
+    the hottest functions). A profile started while another one is active is skipped,
+    so nested stage entry points are covered by the outer profile.
+    """
+    global _active
+    with _active_lock:
+        if _active is not None:
+            nested = True
+        else:
+            nested = False
+            interval = interval or float(os.environ.get(PROFILE_INTERVAL_ENV, DEFAULT_INTERVAL))
+            _active = SamplingProfiler(interval)
+    if nested:
+        yield
+        return
+
+    profiler = _active
+    started_wall = time.perf_counter()
+    started_cpu = time.process_time()
+    started_times = os.times()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        wall = time.perf_counter() - started_wall
+        cpu = time.process_time() - started_cpu
+        finished_times = os.times()
+        children_cpu = (
+            (finished_times.children_user - started_times.children_user)
+            + (finished_times.children_system - started_times.children_system)
+        )
+        with _active_lock:
+            _active = None
+
+        os.makedirs(profile_dir, exist_ok=True)
+        prefix = _unique_prefix(profile_dir, stage)
+        _write_folded(f"{prefix}.wall.folded", profiler.wall_samples)
+        if profiler.cpu_clocks_available:
+            _write_folded(f"{prefix}.cpu.folded", profiler.cpu_samples)
+        summary = {
+            "stage": stage,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "child_process_cpu_seconds": children_cpu,
+            "cpu_utilization": cpu / wall if wall else 0.0,
+            "sample_interval": profiler.interval,
+            "wall_samples": sum(profiler.wall_samples.values()),
+            "cpu_samples": sum(profiler.cpu_samples.values()) if profiler.cpu_clocks_available else None,
+            "top_wall_functions": _top_functions(profiler.wall_samples),
+            "top_cpu_functions": _top_functions(profiler.cpu_samples) if profiler.cpu_clocks_available else None,
+        }
+        with open(f"{prefix}.summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+def profiled(stage):
+    """
+    Decorator for stage entry points. The call is profiled if profiling was enabled
+    for the process (enable() or the DEEP_RESEARCH_PROFILE_DIR environment variable),
+    and runs unchanged otherwise.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile_dir = _profile_dir or os.environ.get(PROFILE_DIR_ENV)
+            if not profile_dir:
+                return fn(*args, **kwargs)
+            with profile(stage, profile_dir):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
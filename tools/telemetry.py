@@ -0,0 +1,204 @@
+import json
+import time
+import itertools
+import functools
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide telemetry of a pipeline run: timed spans (stages, papers, calls) and
+# counters (outbound calls, tokens, bytes, cache hits). reset() starts a new run.
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_span_ids = itertools.count(1)
+_counters = defaultdict(float)
+_run_started_at = time.time()
+_metrics_servers = {}
+
+
+def reset():
+    """Clears all spans and counters, e.g. at the start of a run."""
+    global _run_started_at
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _run_started_at = time.time()
+
+
+def _label_key(name, labels):
+    return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+
+def incr(name, amount=1, **labels):
+    """Adds amount to the counter name with the given labels."""
+    if not amount:
+        return
+    with _lock:
+        _counters[_label_key(name, labels)] += amount
+
+
+def current_span_id():
+    """Id of the innermost active span of this thread (or the one it inherited, see bind()), or None."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]["id"]
+    return getattr(_local, "inherited_parent_id", None)
+
+
+def bind(fn):
+    """
+    Wraps fn so that spans it opens become children of the span active now, even when fn
+    runs in another thread (e.g. as the target of a worker thread).
+    """
+    parent_id = current_span_id()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "inherited_parent_id", None)
+        _local.inherited_parent_id = parent_id
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.inherited_parent_id = previous
+    return wrapper
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the enclosed block as a span. Spans opened in the same thread while this one is
+    active become its children; each span has an id and the id of its parent (parent_id).
+    Attributes can be added through the yielded dictionary.
+    """
+    parent_id = current_span_id()
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {
+        "id": next(_span_ids),
+        "name": name,
+        "parent_id": parent_id,
+        "thread": threading.current_thread().name,
+        "start": time.time() - _run_started_at,
+        "attributes": dict(attributes),
+    }
+    stack.append(record)
+    started = time.perf_counter()
+    started_cpu = time.thread_time()
+    try:
+        yield record["attributes"]
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - started
+        record["cpu_time"] = time.thread_time() - started_cpu
+        stack.pop()
+        with _lock:
+            _spans.append(record)
+
+
+def traced(name, **attributes):
+    """Decorator that records every call of the decorated function as a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Returns the recorded spans and counters as JSON-serializable data."""
+    with _lock:
+        spans = list(_spans)
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+    return {"started_at": _run_started_at, "spans": spans, "counters": counters}
+
+
+def export_trace(path):
+    """Writes the run's spans and counters to a JSON trace file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = [f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels]
+    return "{" + ",".join(parts) + "}"
+
+
+def prometheus_text():
+    """
+    Renders the counters, plus count and total duration of spans per name (and per stage
+    for stage spans), in the Prometheus text exposition format.
+    """
+    data = snapshot()
+    lines = []
+    by_name = defaultdict(list)
+    for counter in data["counters"]:
+        by_name[counter["name"]].append(counter)
+    for name, counters in by_name.items():
+        lines.append(f"# TYPE deep_research_{name} counter")
+        for counter in counters:
+            labels = _format_labels(sorted(counter["labels"].items()))
+            lines.append(f"deep_research_{name}{labels} {counter['value']:g}")
+
+    span_totals = defaultdict(lambda: [0, 0.0])
+    for record in data["spans"]:
+        labels = [("span", record["name"])]
+        if "stage" in record["attributes"]:
+            labels.append(("stage", record["attributes"]["stage"]))
+        totals = span_totals[tuple(labels)]
+        totals[0] += 1
+        totals[1] += record["duration"]
+    if span_totals:
+        lines.append("# TYPE deep_research_span_seconds summary")
+        for span_labels, (count, total) in sorted(span_totals.items()):
+            labels = _format_labels(span_labels)
+            lines.append(f"deep_research_span_seconds_count{labels} {count}")
+            lines.append(f"deep_research_span_seconds_sum{labels} {total:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path):
+    """Writes the current metrics in Prometheus text format, e.g. for a node exporter textfile collector."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serves the metrics at http://host:port/metrics from a background thread and returns the server.
+    Only local clients can connect by default; pass host="0.0.0.0" to let a remote Prometheus scrape it.
+    The server lives as long as the process: later calls for the same address return it again.
+    """
+    with _lock:
+        server = _metrics_servers.get((host, port))
+        if server is None:
+            server = _metrics_servers[(host, port)] = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
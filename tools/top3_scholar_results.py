@@ -1,20 +1,32 @@
 import os
 import json
-import requests
+from tools import outbound
 
-SERPER_API_KEY = os.environ["SERPER_API_KEY"]
+# Overridable so the benchmarks can point the search at a local stand-in.
+SERPER_SCHOLAR_URL = os.environ.get("SERPER_SCHOLAR_URL", "https://google.serper.dev/scholar")
 
-def search_google_scholar(query, api_key, log_fn=print):
-    """Search Google Scholar using the SerperDev API and return the top 3 results."""
-    url = "https://google.serper.dev/scholar"
+def search_google_scholar(query, api_key, log_fn=print, errors=None):
+    """
+    Search Google Scholar using the SerperDev API and return the top 3 results.
+    A failed search also returns no results; if errors is a list, its error is appended to it.
+    """
+    url = SERPER_SCHOLAR_URL
     headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
     payload = json.dumps({"q": query})
 
-    response = requests.post(url, headers=headers, data=payload)
+    try:
+        response = outbound.request("POST", url, service="serper", headers=headers, data=payload, log_fn=log_fn)
+    except Exception as e:
+        log_fn(f"Error fetching data: {e}")
+        if errors is not None:
+            errors.append(f"Search for '{query}' failed: {e}")
+        return []
     if response.status_code == 200:
         return response.json().get("organic", [])[:3]  # Get top 3 results
     else:
-        log_fn("Error fetching data:", response.text)
+        log_fn(f"Error fetching data: {response.text}")
+        if errors is not None:
+            errors.append(f"Search for '{query}' failed with status {response.status_code}.")
         return []
 
 def extract_research_info(results):